@@ -1,11 +1,33 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import gspread
 from google.oauth2.service_account import Credentials
 from gspread.exceptions import SpreadsheetNotFound, APIError
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
 from datetime import date
+import bisect
+import functools
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING
 import plotly.express as px  # Added for analytics visualizations
 
+if TYPE_CHECKING:
+    from fake_sheets import WorksheetBackend
+
 # Page configuration
 st.set_page_config(page_title="🚬 Smoking & Spend Tracker", layout="wide")
 
@@ -15,123 +37,2073 @@ DEFAULT_COLUMNS = [
     "PricePerPack", "TotalCost", "PaymentMethod",
     "AmountPaid", "Outstanding", "Vendor", "Notes"
 ]
+# Hidden stable identifier, kept in the column right after DEFAULT_COLUMNS (column L)
+ID_COLUMN = "ID"
+ID_INDEX = len(DEFAULT_COLUMNS)
+SHEET_COLUMNS = DEFAULT_COLUMNS + [ID_COLUMN]
+
+def get_setting(name: str, default=None):
+    """Read an optional setting from the environment (``TRACKER_<NAME>``) or Streamlit secrets."""
+    env_value = os.environ.get(f"TRACKER_{name.upper()}")
+    if env_value is not None:
+        return env_value
+    try:
+        return st.secrets.get(name, default)
+    except Exception:
+        return default
+
+# ---------- Request Governor ----------
+READ_QUOTA_PER_MINUTE = int(get_setting("read_quota_per_minute", 60))
+WRITE_QUOTA_PER_MINUTE = int(get_setting("write_quota_per_minute", 60))
+PROJECT_QUOTA_PER_MINUTE = int(get_setting("project_quota_per_minute", 300))
+MAX_RETRIES = int(get_setting("max_retries", 5))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# A 5xx may come after the write was applied, so unsafe writes only retry on 429
+NON_IDEMPOTENT_RETRYABLE_STATUS = {429}
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate_per_minute``."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 6.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait before using it."""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class SheetsGovernor:
+    """Central gate for every Sheets API call: quota buckets, retries with backoff and coalesced reads."""
+
+    def __init__(self, read_per_minute=READ_QUOTA_PER_MINUTE, write_per_minute=WRITE_QUOTA_PER_MINUTE,
+                 project_per_minute=PROJECT_QUOTA_PER_MINUTE, max_retries=MAX_RETRIES,
+                 base_delay=1.0, max_delay=32.0, clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.buckets = {
+            "read": TokenBucket(read_per_minute, clock=clock),
+            "write": TokenBucket(write_per_minute, clock=clock),
+            "project": TokenBucket(project_per_minute, clock=clock),
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.stats = {"calls": 0, "throttled": 0, "retried": 0, "coalesced": 0, "failed": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _throttle(self, kind):
+        wait = max(self.buckets[kind].reserve(), self.buckets["project"].reserve())
+        if wait > 0:
+            self._count("throttled")
+            self.sleep(wait)
+
+    def _backoff(self, attempt, error) -> float:
+        retry_after = getattr(getattr(error, "response", None), "headers", {}).get("Retry-After")
+        if retry_after and str(retry_after).isdigit():
+            return float(retry_after)
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + self.rng() * delay / 2
+
+    def _execute(self, kind, fn, args, kwargs, retryable=RETRYABLE_STATUS):
+        for attempt in range(self.max_retries + 1):
+            self._throttle(kind)
+            self._count("calls")
+            try:
+                return fn(*args, **kwargs)
+            except APIError as e:
+                if e.code not in retryable or attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                self._count("retried")
+                self.sleep(self._backoff(attempt, e))
+
+    def call(self, kind: str, fn, *args, coalesce_key=None, idempotent=True, **kwargs):
+        """Run ``fn`` as a "read" or "write" API call under quota and retry rules."""
+        if not idempotent:
+            return self._execute(kind, fn, args, kwargs, NON_IDEMPOTENT_RETRYABLE_STATUS)
+        if kind != "read" or coalesce_key is None:
+            return self._execute(kind, fn, args, kwargs)
+        with self.lock:
+            future = self.inflight.get(coalesce_key)
+            leader = future is None
+            if leader:
+                future = self.inflight[coalesce_key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(self._execute(kind, fn, args, kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.inflight.pop(coalesce_key, None)
+        return future.result()
+
+class GovernedWorksheet:
+    """Worksheet proxy that routes every API method through a SheetsGovernor."""
+
+    READ_METHODS = {"get_all_values", "get_all_records", "get", "batch_get", "row_values", "col_values", "acell", "cell"}
+    WRITE_METHODS = {"append_row", "append_rows", "batch_update", "update", "update_acell", "delete_rows", "insert_row", "insert_rows", "clear"}
+    # Repeating these after a write that landed would duplicate or remove another row
+    NON_IDEMPOTENT_METHODS = {"append_row", "append_rows", "delete_rows", "insert_row", "insert_rows"}
+
+    def __init__(self, ws: "WorksheetBackend", governor: SheetsGovernor):
+        self._ws = ws
+        self._governor = governor
+
+    def __getattr__(self, name):
+        attr = getattr(self._ws, name)
+        if name in self.READ_METHODS:
+            def governed_read(*args, **kwargs):
+                key = (self._ws.spreadsheet_id, self._ws.id, name, repr(args), repr(sorted(kwargs.items())))
+                return self._governor.call("read", attr, *args, coalesce_key=key, **kwargs)
+            return governed_read
+        if name in self.WRITE_METHODS:
+            return functools.partial(self._governor.call, "write", attr,
+                                     idempotent=name not in self.NON_IDEMPOTENT_METHODS)
+        return attr
+
+@st.cache_resource
+def get_governor() -> SheetsGovernor:
+    """The process-wide governor shared by all sessions and background threads."""
+    return SheetsGovernor()
 
 # ---------- Google Sheets Integration ----------
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+@st.cache_resource
+def _connection_pool():
+    """Process-wide registry of authorized clients and open worksheet handles, kept across reruns."""
+    return {"lock": threading.Lock(), "clients": {}, "worksheets": {}}
+
+def _credentials_key(info) -> str:
+    """Stable fingerprint of a service account credential set."""
+    return hashlib.sha256(json.dumps(dict(info), sort_keys=True, default=str).encode()).hexdigest()
+
 def get_gsheets_client():
-    """Authenticate and return a gspread client."""
+    """Return the shared gspread client for the configured service account, refreshing its token ahead of expiry."""
     try:
         info = st.secrets["gcp_service_account"]
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds = Credentials.from_service_account_info(info, scopes=scopes)
-        return gspread.authorize(creds)
+        key = _credentials_key(info)
+        pool = _connection_pool()
+        with pool["lock"]:
+            client = pool["clients"].get(key)
+            if client is None:
+                creds = Credentials.from_service_account_info(info, scopes=SCOPES).with_non_blocking_refresh()
+                client = pool["clients"][key] = gspread.authorize(creds)
+        return client
     except Exception as e:
         st.error(f"Authentication failed. Ensure service account credentials are set in Secrets. Details: {e}")
         return None
 
+def _drop_client(pool, client):
+    """Remove a client from the pool so the next call re-authorizes. Caller holds the lock."""
+    pool["clients"] = {k: c for k, c in pool["clients"].items() if c is not client}
+
+def invalidate_connection(ws, drop_client: bool = False):
+    """Forget cached handles for a worksheet (and optionally its client)."""
+    pool = _connection_pool()
+    with pool["lock"]:
+        for key, (client, cached_ws) in list(pool["worksheets"].items()):
+            if cached_ws is ws:
+                del pool["worksheets"][key]
+                if drop_client:
+                    _drop_client(pool, client)
+
+def _invalidate_on_auth_error(ws, e):
+    """Drop stale connection state when the API reports an auth/access error."""
+    if isinstance(e, APIError) and e.code in (401, 403, 404):
+        invalidate_connection(ws, drop_client=e.code == 401)
+
+def open_fake_spreadsheet(sheet_url_or_title: str):
+    """Open a local fake worksheet for ``fake://<name>`` URLs (offline tests and benchmarks)."""
+    from fake_sheets import open_fake_worksheet
+
+    quota = get_setting("fake_quota_per_minute")
+    ws = open_fake_worksheet(
+        sheet_url_or_title[len("fake://"):] or "default",
+        directory=get_setting("fake_sheets_dir"),
+        latency=float(get_setting("fake_latency", 0)),
+        quota_per_minute=int(quota) if quota else None,
+        error_rate=float(get_setting("fake_error_rate", 0)),
+    )
+    return GovernedWorksheet(ws, get_governor())
+
 def open_spreadsheet(sheet_url_or_title: str):
-    """Open a Google Sheet by URL or title."""
+    """Open a Google Sheet by URL or title, reusing a cached worksheet handle."""
+    if sheet_url_or_title.startswith("fake://"):
+        return open_fake_spreadsheet(sheet_url_or_title)
     client = get_gsheets_client()
     if not client:
         return None
+    pool = _connection_pool()
+    with pool["lock"]:
+        cached = pool["worksheets"].get(sheet_url_or_title)
+    if cached and cached[0] is client:
+        return cached[1]
+    governor = get_governor()
     try:
         if sheet_url_or_title.startswith("http"):
-            return client.open_by_url(sheet_url_or_title).sheet1
-        return client.open(sheet_url_or_title).sheet1
+            spreadsheet = governor.call("read", client.open_by_url, sheet_url_or_title)
+        else:
+            spreadsheet = governor.call("read", client.open, sheet_url_or_title)
+        ws = GovernedWorksheet(governor.call("read", lambda: spreadsheet.sheet1), governor)
+        with pool["lock"]:
+            pool["worksheets"][sheet_url_or_title] = (client, ws)
+        return ws
     except SpreadsheetNotFound:
         st.error("Spreadsheet not found. Verify URL/title and Editor access for the service account.")
     except APIError as e:
+        if e.code == 401:
+            with pool["lock"]:
+                _drop_client(pool, client)
         st.error(f"Google Sheets API error (quota/permissions). Details: {e}")
     except Exception as e:
         st.error(f"Unexpected error opening spreadsheet. Details: {e}")
     return None
 
+def _row_range(idx_1based: int, width: int = len(DEFAULT_COLUMNS)) -> str:
+    """A1 range spanning one record row, e.g. ``A5:K5``."""
+    return f"A{idx_1based}:{rowcol_to_a1(idx_1based, width)}"
+
+def batch_update_rows(ws, rows_by_index: dict):
+    """Overwrite rows in place with one batched request; ``rows_by_index`` maps 1-based row numbers to values."""
+    if not rows_by_index:
+        return
+    ws.batch_update(
+        [{"range": _row_range(idx, len(row)), "values": [list(row)]} for idx, row in sorted(rows_by_index.items())],
+        raw=True,
+    )
+
+# ---------- Sheet Snapshot ----------
+CHANGE_PROBE_SECONDS = float(get_setting("change_probe_seconds", 20))
+# Backstop for changes the probe cannot see (no Drive metadata and the last rows unchanged)
+MAX_SNAPSHOT_AGE_SECONDS = float(get_setting("max_snapshot_age_seconds", 600))
+NUMERIC_COLUMNS = ["Quantity", "UnitsPerPack", "PricePerPack", "TotalCost", "AmountPaid", "Outstanding"]
+
+@dataclass
+class SheetSnapshot:
+    """A single read of the worksheet, shared by header checks, loading and search."""
+    values: list        # raw grid as returned by get_all_values(), header row included
+    header: list
+    df: pd.DataFrame    # typed rows in DEFAULT_COLUMNS order
+    row_numbers: list   # 1-based sheet row of each DataFrame row
+    version: int
+    fetched_at: float = field(default_factory=time.monotonic)
+    revision: str = None  # spreadsheet modifiedTime when read, or after our own last write; None when unknown
+    parse_failures: dict = field(default_factory=dict)  # column -> cells that failed to parse
+    search_index: "SearchIndex" = None  # built on first search, then maintained incrementally
+    row_ids: dict = field(default_factory=dict)  # row ID -> position (sheet row - 2)
+    rollups: "Rollups" = None  # analytics aggregates, built on first use like search_index
+    ledger: "CreditLedger" = None  # per-vendor credit ledgers, built on first use like rollups
+    missing_ids: int = 0  # non-blank rows without an ID, e.g. typed straight into the sheet
+
+# ---------- Typed Parser ----------
+DATE_FORMAT = "%Y-%m-%d"
+CATEGORICAL_COLUMNS = ["Brand", "PaymentMethod", "Vendor"]
+ARROW_STRINGS = str(get_setting("arrow_strings", "")).lower() in ("1", "true", "yes")
+
+def _empty_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=DEFAULT_COLUMNS)
+
+def _parse_dates(cells, empty):
+    """Parse with the fixed ISO format; only cells that miss it fall back to inference."""
+    dates = pd.Series(pd.to_datetime(cells, format=DATE_FORMAT, errors="coerce"))
+    retry = dates.isna().to_numpy() & ~empty
+    if retry.any():
+        dates[retry] = pd.to_datetime(pd.Series(cells[retry]), format="mixed", errors="coerce").to_numpy()
+    return dates
+
+def _parse_numeric_block(block, empty):
+    """Parse all numeric columns in one vectorized pass, falling back per column on bad cells."""
+    try:
+        if _has_pyarrow():
+            import pyarrow as pa
+            import pyarrow.compute as pc
+
+            cells = pa.array(block.ravel(), type=pa.string(), mask=empty.ravel())
+            cells = pc.replace_substring(cells, ",", "")
+            return pc.cast(cells, pa.float64()).to_numpy(zero_copy_only=False).reshape(block.shape)
+        text = np.char.replace(block.astype(str), ",", "")
+        text[empty] = "nan"
+        return text.astype(np.float64)
+    except (ValueError, TypeError):  # pyarrow's ArrowInvalid is a ValueError
+        return np.column_stack([
+            pd.to_numeric(pd.Series(block[:, j]).str.replace(",", "", regex=False), errors="coerce").to_numpy(dtype=np.float64)
+            for j in range(block.shape[1])
+        ])
+
+def parse_grid(values):
+    """Convert a raw value grid into typed columns; returns ``(df, failures)`` with unparsable cells per column."""
+    if len(values) < 2:
+        return _empty_frame(), {}
+    header = values[0]
+    grid = pd.DataFrame(values[1:], dtype=object).to_numpy()
+    # Short rows are padded with None; any such row shows up in the last column
+    ragged = grid.shape[1] > 0 and pd.isna(grid[:, -1]).any()
+    positions = {}
+    for i, name in enumerate(header):
+        positions.setdefault(name, i)
+
+    def column(name):
+        i = positions.get(name)
+        if i is None or i >= grid.shape[1]:
+            return np.full(len(grid), "", dtype=object)
+        cells = grid[:, i]
+        return np.where(pd.isna(cells), "", cells) if ragged else cells
+
+    failures = {}
+    data = {}
+
+    dates = column("Date")
+    empty = dates == ""
+    data["Date"] = _parse_dates(dates, empty)
+    failures["Date"] = int((data["Date"].isna().to_numpy() & ~empty).sum())
+
+    block = np.column_stack([column(c) for c in NUMERIC_COLUMNS])
+    empty = block == ""
+    numbers = _parse_numeric_block(block, empty)
+    for j, (col, bad) in enumerate(zip(NUMERIC_COLUMNS, (np.isnan(numbers) & ~empty).sum(axis=0))):
+        data[col] = numbers[:, j]
+        failures[col] = int(bad)
+
+    for col in CATEGORICAL_COLUMNS:
+        data[col] = pd.Categorical(column(col))
+    notes = column("Notes")
+    data["Notes"] = pd.array(notes, dtype="string[pyarrow]") if ARROW_STRINGS and _has_pyarrow() else notes
+
+    df = pd.DataFrame(data)[DEFAULT_COLUMNS]
+    return df, {col: n for col, n in failures.items() if n}
+
+def parse_values(values) -> pd.DataFrame:
+    """Convert a raw value grid (header row first) into a typed DataFrame."""
+    return parse_grid(values)[0]
+
+@functools.lru_cache(maxsize=None)
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def align_categories(base: pd.DataFrame, patch: pd.DataFrame):
+    """Give ``patch``'s categorical columns the categories of ``base``, extending both in place."""
+    for col in CATEGORICAL_COLUMNS:
+        if not isinstance(base[col].dtype, pd.CategoricalDtype):
+            continue
+        patch_values = patch[col].astype(object)
+        missing = pd.Index(patch_values.unique()).difference(base[col].cat.categories)
+        if len(missing):
+            base[col] = base[col].cat.add_categories(missing)
+        patch[col] = pd.Categorical(patch_values, categories=base[col].cat.categories)
+
+def has_row_ids(header) -> bool:
+    return len(header) > ID_INDEX and header[ID_INDEX] == ID_COLUMN
+
+def row_id_of(row):
+    """The ID cell of a sheet row, or None for rows written before IDs existed."""
+    return (row[ID_INDEX] or None) if len(row) > ID_INDEX else None
+
+def _row_id_map(values):
+    """``(ids, missing)``: row ID -> position, and the count of non-blank rows lacking one."""
+    if not values or not has_row_ids(values[0]):
+        return {}, 0
+    ids, missing = {}, 0
+    for pos, row in enumerate(values[1:]):
+        row_id = row_id_of(row)
+        if row_id:
+            ids[row_id] = pos
+        elif any(row[:ID_INDEX]):
+            missing += 1
+    return ids, missing
+
+def build_snapshot(values, version: int = 0) -> SheetSnapshot:
+    """Build a snapshot from a raw value grid."""
+    df, failures = parse_grid(values)
+    row_ids, missing_ids = _row_id_map(values)
+    return SheetSnapshot(
+        values=values,
+        header=values[0] if values else [],
+        df=df,
+        row_numbers=list(range(2, len(values) + 1)),
+        version=version,
+        parse_failures=failures,
+        row_ids=row_ids,
+        missing_ids=missing_ids,
+    )
+
+@st.cache_resource
+def _snapshot_store():
+    """Process-wide snapshots keyed by worksheet, shared by all sessions."""
+    return {"lock": threading.Lock(), "snapshots": {}, "fetch_locks": {}, "versions": {}}
+
+def _sheet_key(ws):
+    return (ws.spreadsheet_id, ws.id)
+
+def _next_version(store, key) -> int:
+    """Bump and return the data version for a worksheet. Caller holds the store lock."""
+    version = store["versions"].get(key, 0) + 1
+    store["versions"][key] = version
+    return version
+
+def _fetch_lock(store, key):
+    with store["lock"]:
+        return store["fetch_locks"].setdefault(key, threading.Lock())
+
+def get_snapshot(ws: "WorksheetBackend") -> SheetSnapshot:
+    """Return the cached snapshot, reading the sheet only when it was dropped or is older than MAX_SNAPSHOT_AGE_SECONDS."""
+    store = _snapshot_store()
+    key = _sheet_key(ws)
+    with _fetch_lock(store, key):
+        snap = store["snapshots"].get(key)
+        if snap is not None and time.monotonic() - snap.fetched_at < MAX_SNAPSHOT_AGE_SECONDS:
+            return snap
+        watch_for_changes(ws)
+        mirror = get_mirror(ws)
+        revision = None if mirror else sheet_revision(ws)
+        queue = get_write_queue(ws)
+        if mirror:
+            values = mirror.values()
+        elif queue is not None:
+            # Entries still waiting in the write-behind queue stay visible across reloads
+            with queue.flush_lock:
+                values = ws.get_all_values()
+                if values:
+                    values = values + [[_cell_text(c) for c in row] for row in queue.pending_rows()]
+        else:
+            values = ws.get_all_values()
+        with store["lock"]:
+            snap = build_snapshot(values, _next_version(store, key))
+            snap.revision = revision
+            store["snapshots"][key] = snap
+        return snap
+
+def invalidate_snapshot(ws=None):
+    """Drop the cached snapshot for a worksheet, or all snapshots when ws is None."""
+    store = _snapshot_store()
+    with store["lock"]:
+        if ws is None:
+            store["snapshots"].clear()
+        else:
+            store["snapshots"].pop(_sheet_key(ws), None)
+
+# ---------- Incremental Snapshot Sync ----------
+def _cell_text(value) -> str:
+    """Render a written value roughly the way get_all_values() would return it."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else f"{value:.10g}"
+    return str(value)
+
+def _cell_key(cell) -> str:
+    """Normalize a cell for comparison, so ``30``, ``30.0`` and ``"30"`` are equal."""
+    text = str(cell).strip()
+    try:
+        return f"{float(text.replace(',', '')):.6f}"
+    except ValueError:
+        return text
+
+def row_fingerprint(row) -> str:
+    """Content hash of a row, ignoring trailing empty cells and number formatting."""
+    cells = [_cell_key(c) for c in row]
+    while cells and cells[-1] == "":
+        cells.pop()
+    return hashlib.sha1("\x1f".join(cells).encode()).hexdigest()
+
+def _as_sheet_rows(snap, rows):
+    """Convert written rows into padded text rows matching the snapshot grid."""
+    width = len(snap.header)
+    text_rows = [[_cell_text(v) for v in row] for row in rows]
+    return [r + [""] * (width - len(r)) for r in text_rows]
+
+def snapshot_with_appended(snap, rows) -> SheetSnapshot:
+    """Return a copy of the snapshot with rows added at the bottom."""
+    rows = _as_sheet_rows(snap, rows)
+    values = snap.values + rows
+    patch = parse_values([snap.header] + rows)
+    if snap.df.empty:
+        df = parse_values(values)
+    else:
+        df = snap.df.copy(deep=False)
+        align_categories(df, patch)
+        df = pd.concat([df, patch], ignore_index=True)
+    if snap.search_index is not None:
+        snap.search_index.append(rows)
+    if snap.rollups is not None:
+        snap.rollups.add(patch)
+    if snap.ledger is not None:
+        snap.ledger.add(patch)
+    # Positions of existing rows do not move, so the ID map is extended in place
+    missing_ids = snap.missing_ids
+    for pos, row in enumerate(rows, start=len(snap.values) - 1):
+        if row_id_of(row):
+            snap.row_ids[row_id_of(row)] = pos
+        elif has_row_ids(snap.header) and any(row[:ID_INDEX]):
+            missing_ids += 1
+    return replace(snap, values=values, df=df, row_numbers=list(range(2, len(values) + 1)), missing_ids=missing_ids)
+
+def snapshot_with_updated(snap, rows_by_index: dict) -> SheetSnapshot:
+    """Return a copy of the snapshot with the given sheet rows replaced, keeping cells past each row's end."""
+    indices = sorted(rows_by_index)
+    rows = [list(rows_by_index[i]) + snap.values[i - 1][len(rows_by_index[i]):] for i in indices]
+    rows = _as_sheet_rows(snap, rows)
+    values = list(snap.values)
+    for idx, row in zip(indices, rows):
+        values[idx - 1] = row
+    patch = parse_values([snap.header] + rows)
+    patch.index = [idx - 2 for idx in indices]  # row_numbers is always 2..n+1
+    df = snap.df.copy()
+    align_categories(df, patch)
+    if snap.rollups is not None:
+        snap.rollups.remove(snap.df.loc[patch.index])
+        snap.rollups.add(patch)
+    if snap.ledger is not None:
+        snap.ledger.remove(snap.df.loc[patch.index])
+        snap.ledger.add(patch)
+    df.loc[patch.index, DEFAULT_COLUMNS] = patch
+    if snap.search_index is not None:
+        for idx, row in zip(indices, rows):
+            snap.search_index.update(idx - 2, row)
+    return replace(snap, values=values, df=df)
+
+def snapshot_with_deleted(snap, idx_1based: int) -> SheetSnapshot:
+    """Return a copy of the snapshot without the given sheet row."""
+    values = snap.values[:idx_1based - 1] + snap.values[idx_1based:]
+    df = snap.df.drop(index=idx_1based - 2).reset_index(drop=True)
+    if snap.rollups is not None:
+        snap.rollups.remove(snap.df.loc[[idx_1based - 2]])
+    if snap.ledger is not None:
+        snap.ledger.remove(snap.df.loc[[idx_1based - 2]])
+    if snap.search_index is not None:
+        snap.search_index.delete(idx_1based - 2)
+    row_ids, missing_ids = _row_id_map(values)
+    return replace(snap, values=values, df=df, row_numbers=list(range(2, len(values) + 1)),
+                   row_ids=row_ids, missing_ids=missing_ids)
+
+def _tail_matches(ws, snap) -> bool:
+    """Cheap drift check: the last known row must match and nothing may follow it."""
+    n = len(snap.values)
+    if n == 0:
+        return not ws.get(_row_range(1))
+    width = max(len(snap.header), len(DEFAULT_COLUMNS))
+    live = ws.get(f"A{n}:{rowcol_to_a1(n + 1, width)}")
+    return [row_fingerprint(r) for r in live] == [row_fingerprint(snap.values[-1])]
+
+def _appended_row_number(response, last: bool = False):
+    """Sheet row an append landed on (first or last row), parsed from the API's updatedRange."""
+    try:
+        cells = response["updates"]["updatedRange"].split("!")[-1].split(":")
+        return a1_to_rowcol(cells[-1] if last else cells[0])[0]
+    except (KeyError, TypeError, AttributeError, IndexError):
+        return None
+
+def drop_if_changed(ws):
+    """Drop the snapshot before a write if someone else changed the sheet since it was read."""
+    store = _snapshot_store()
+    key = _sheet_key(ws)
+    snap = store["snapshots"].get(key)
+    if snap is None or snap.revision is None:
+        return
+    revision = sheet_revision(ws)
+    if revision is not None and revision != snap.revision:
+        with store["lock"]:
+            if store["snapshots"].get(key) is snap:
+                store["snapshots"].pop(key, None)
+
+def sync_after_write(ws, mutate, landed_row=None, verify: bool = True):
+    """Apply a successful write to the cached snapshot, dropping it if the sheet has drifted from it."""
+    store = _snapshot_store()
+    key = _sheet_key(ws)
+    with _fetch_lock(store, key):
+        snap = store["snapshots"].get(key)
+        if snap is None:
+            return
+        try:
+            new = mutate(snap)
+            if verify:
+                # None when unavailable or unknown before the write; the probe then re-baselines it from the tail
+                new.revision = sheet_revision(ws) if snap.revision is not None else None
+            if not verify:
+                consistent = True
+            elif landed_row is not None:
+                consistent = landed_row == len(new.values)
+            else:
+                consistent = _tail_matches(ws, new)
+        except (IndexError, KeyError, ValueError):
+            new, consistent = None, False
+        with store["lock"]:
+            if consistent:
+                new.version = _next_version(store, key)
+                store["snapshots"][key] = new
+            else:
+                store["snapshots"].pop(key, None)
+
+# ---------- Change Detection ----------
+def sheet_revision(ws: "WorksheetBackend"):
+    """The spreadsheet's last-modified time from Drive metadata, or None if unavailable."""
+    spreadsheet = getattr(ws, "spreadsheet", None)
+    if spreadsheet is None or not hasattr(spreadsheet, "get_lastUpdateTime"):
+        return None
+    try:
+        return get_governor().call("read", spreadsheet.get_lastUpdateTime, coalesce_key=(ws.spreadsheet_id, "revision"))
+    except Exception:  # e.g. the Drive API is not enabled for the service account
+        return None
+
+PREFIX_SAMPLE_ROWS = int(get_setting("prefix_sample_rows", 16))
+
+def fetch_appended_rows(ws, snap):
+    """The snapshot extended with rows added below it, or None if the sheet changed otherwise."""
+    n = len(snap.values)
+    if n < 2:
+        return None
+    width = max(len(snap.header), len(DEFAULT_COLUMNS))
+    sampled = sorted({1, n} | set(random.sample(range(2, n), min(PREFIX_SAMPLE_ROWS, n - 2))))
+    ranges = [_row_range(row_num, width) for row_num in sampled]
+    ranges.append(f"A{n + 1}:{rowcol_to_a1(1, width)[:-1]}")
+    live = ws.batch_get(ranges)
+    for row_num, cells in zip(sampled, live):
+        if row_fingerprint(cells[0] if cells else []) != row_fingerprint(snap.values[row_num - 1]):
+            return None
+    added = [list(row) for row in live[-1]]
+    return snapshot_with_appended(snap, added) if added else None
+
+def probe_for_changes(ws) -> bool:
+    """Bring the worksheet's snapshot up to date if the sheet changed; True if it changed."""
+    store = _snapshot_store()
+    key = _sheet_key(ws)
+    snap = store["snapshots"].get(key)
+    if snap is None:
+        return False
+    revision = sheet_revision(ws)
+    if revision is not None and revision == snap.revision:
+        return False
+    with _fetch_lock(store, key):
+        if store["snapshots"].get(key) is not snap:
+            return False  # replaced by a write or reload meanwhile
+        if (revision is None or snap.revision is None) and _tail_matches(ws, snap):
+            snap.revision = revision
+            return False
+        new = fetch_appended_rows(ws, snap)
+        with store["lock"]:
+            if new is None:
+                store["snapshots"].pop(key, None)
+            else:
+                new.version = _next_version(store, key)
+                new.revision = revision
+                store["snapshots"][key] = new
+    return True
+
+class ChangeProbe(threading.Thread):
+    """One background thread for the whole process that probes every watched sheet for changes."""
+
+    def __init__(self, interval: float = CHANGE_PROBE_SECONDS):
+        super().__init__(daemon=True, name="change-probe")
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.sheets = {}
+        self.last_error = None
+
+    def watch(self, ws):
+        with self.lock:
+            self.sheets[_sheet_key(ws)] = ws  # the latest handle; pooled clients get replaced
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                sheets = list(self.sheets.values())
+            for ws in sheets:
+                try:
+                    queue = get_write_queue(ws)
+                    if get_mirror(ws) is None and (queue is None or not queue.pending_count()):
+                        probe_for_changes(ws)
+                    self.last_error = None
+                except Exception as e:  # keep serving the cached snapshot and retry next tick
+                    self.last_error = e
+
+@st.cache_resource
+def _change_probe() -> ChangeProbe:
+    probe = ChangeProbe()
+    probe.start()
+    return probe
+
+def watch_for_changes(ws):
+    """Register a worksheet with the shared change probe."""
+    if CHANGE_PROBE_SECONDS > 0:
+        _change_probe().watch(ws)
+
+# ---------- Search Index ----------
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def _row_text(row) -> str:
+    return "\x1f".join(str(cell) for cell in row).lower()
+
+class SearchIndex:
+    """Inverted index for the search box: word tokens -> rows, trigrams -> tokens."""
+
+    def __init__(self, rows, width: int = None):
+        self.lock = threading.Lock()
+        self.width = width
+        self.postings = {}
+        self.extra = {}  # token -> doc ids added after the bulk build
+        self._grams = None
+        # Tokenize each distinct cell value once per column, then expand to rows
+        chunks = {}
+        grid = pd.DataFrame(rows, dtype=object)
+        for j in grid.columns[:width]:
+            codes, uniques = pd.factorize(grid[j])
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            for u, value in enumerate(uniques):
+                members = order[bounds[u]:bounds[u + 1]]
+                for token in set(TOKEN_PATTERN.findall(str(value).lower())):
+                    chunks.setdefault(token, []).append(members)
+        for token, parts in chunks.items():
+            self.postings[token] = np.unique(np.concatenate(parts)) if len(parts) > 1 else parts[0]
+        self.order = list(range(len(rows)))
+        self.next_doc = len(rows)
+        self._positions = np.arange(len(rows), dtype=np.int64)
+        self._positions_stale = False
+
+    # ----- maintenance -----
+    def _add_doc(self, row) -> int:
+        doc = self.next_doc
+        self.next_doc += 1
+        for token in set(TOKEN_PATTERN.findall(_row_text(row[:self.width]))):
+            if token not in self.postings and token not in self.extra and self._grams is not None:
+                self._index_token(token)
+            self.extra.setdefault(token, set()).add(doc)
+        if len(self._positions) < self.next_doc:
+            grown = np.full(max(self.next_doc, 2 * len(self._positions)), -1, dtype=np.int64)
+            grown[:len(self._positions)] = self._positions
+            self._positions = grown
+        return doc
+
+    def append(self, rows):
+        with self.lock:
+            for row in rows:
+                doc = self._add_doc(row)
+                self._positions[doc] = len(self.order)
+                self.order.append(doc)
+
+    def update(self, position: int, row):
+        with self.lock:
+            doc = self._add_doc(row)
+            self._positions[self.order[position]] = -1
+            self._positions[doc] = position
+            self.order[position] = doc
+
+    def delete(self, position: int):
+        with self.lock:
+            self._positions[self.order.pop(position)] = -1
+            self._positions_stale = True  # every later row moved up by one
+
+    def _position_map(self):
+        if self._positions_stale:
+            self._positions[:] = -1
+            self._positions[np.asarray(self.order, dtype=np.int64)] = np.arange(len(self.order))
+            self._positions_stale = False
+        return self._positions
+
+    # ----- lookup -----
+    def _index_token(self, token):
+        for i in range(len(token) - 2):
+            self._grams.setdefault(token[i:i + 3], set()).add(token)
+
+    def _tokens_containing(self, word) -> list:
+        if self._grams is None:
+            self._grams = {}
+            for token in list(self.postings) + list(self.extra):
+                self._index_token(token)
+        if len(word) < 3:
+            return [t for t in set(self.postings) | set(self.extra) if word in t]
+        candidates = set.intersection(*(self._grams.get(word[i:i + 3], set()) for i in range(len(word) - 2)))
+        return [t for t in candidates if word in t]
+
+    def _docs_containing(self, word):
+        """Boolean mask over document ids of the documents with a token containing ``word``."""
+        docs = np.zeros(self.next_doc, dtype=bool)
+        for token in self._tokens_containing(word):
+            if token in self.postings:
+                docs[self.postings[token]] = True
+            if token in self.extra:
+                docs[np.fromiter(self.extra[token], dtype=np.int64, count=len(self.extra[token]))] = True
+        return docs
+
+    def search(self, keyword: str, rows=None):
+        """Ascending row positions whose cells contain ``keyword``, or None when it has no word to index on."""
+        needle = keyword.lower()
+        words = sorted(set(TOKEN_PATTERN.findall(needle)), key=len, reverse=True)
+        if not words:
+            return None
+        with self.lock:
+            docs = None
+            for word in words:
+                found = self._docs_containing(word)
+                docs = found if docs is None else docs & found
+                if not docs.any():
+                    return np.empty(0, dtype=np.int64)
+            positions = self._position_map()[:self.next_doc][docs]
+        positions = np.sort(positions[positions >= 0])
+        if words == [needle] or rows is None:
+            return positions
+        # Cells are joined with a separator no keyword contains, so a match cannot span two cells
+        return np.array([p for p in positions.tolist() if p < len(rows) and needle in "\x1f".join(map(str, rows[p][:self.width])).lower()],
+                        dtype=np.int64)
+
+def get_search_index(ws, snap) -> SearchIndex:
+    """The snapshot's search index, built on first use."""
+    if snap.search_index is None:
+        with _fetch_lock(_snapshot_store(), _sheet_key(ws)):
+            if snap.search_index is None:
+                snap.search_index = SearchIndex(snap.values[1:], ID_INDEX if has_row_ids(snap.header) else None)
+    return snap.search_index
+
+# ---------- Query Language ----------
+QUERY_FIELDS = {
+    "date": "Date", "brand": "Brand", "vendor": "Vendor", "notes": "Notes", "note": "Notes",
+    "payment": "PaymentMethod", "pay": "PaymentMethod", "method": "PaymentMethod",
+    "quantity": "Quantity", "qty": "Quantity", "sticks": "Quantity", "units": "UnitsPerPack",
+    "price": "PricePerPack", "total": "TotalCost", "cost": "TotalCost", "paid": "AmountPaid",
+    "outstanding": "Outstanding", "due": "Outstanding",
+}
+QUERY_TERM = re.compile(r'(?P<field>[A-Za-z]+)(?P<op>:|>=|<=|>|<|=)(?P<value>"[^"]*"|\S*)|"(?P<phrase>[^"]*)"|(?P<word>\S+)')
+
+class QueryError(ValueError):
+    """A search query that could not be understood."""
+
+@dataclass
+class QueryTerm:
+    field: str   # DataFrame column, or None for free text
+    op: str      # ":", "=", ">", ">=", "<", "<="
+    value: str
+
+def parse_query(text: str) -> list:
+    """Split a search string into field filters and free-text words; unknown fields are free text."""
+    terms = []
+    for m in QUERY_TERM.finditer(text):
+        if m.group("field") and m.group("field").lower() in QUERY_FIELDS:
+            value = m.group("value").strip('"')
+            if not value:
+                raise QueryError(f"Missing value after '{m.group('field')}{m.group('op')}'")
+            terms.append(QueryTerm(QUERY_FIELDS[m.group("field").lower()], m.group("op"), value))
+        elif m.group("phrase") is not None:
+            terms.append(QueryTerm(None, ":", m.group("phrase")))
+        else:
+            terms.append(QueryTerm(None, ":", m.group(0)))
+    return [t for t in terms if t.value]
+
+def is_structured(terms) -> bool:
+    return any(t.field is not None for t in terms)
+
+def _date_period(value: str):
+    """[start, end) covering a YYYY, YYYY-MM or YYYY-MM-DD value."""
+    parts = value.split("-")
+    try:
+        start = pd.Timestamp(value if len(parts) > 1 else f"{value}-01-01")
+    except ValueError:
+        raise QueryError(f"Not a date: '{value}' (use YYYY, YYYY-MM or YYYY-MM-DD)")
+    step = {1: pd.DateOffset(years=1), 2: pd.DateOffset(months=1)}.get(len(parts), pd.DateOffset(days=1))
+    return start, start + step
+
+def _number(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise QueryError(f"Not a number: '{value}'")
+
+def _text_mask(series, value: str):
+    """Case-insensitive substring match, evaluated once per category for categoricals."""
+    needle = value.lower()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        cats = series.cat.categories
+        hits = cats[pd.Series(cats, dtype=object).astype(str).str.lower().str.contains(needle, regex=False).to_numpy()]
+        return series.isin(hits).to_numpy()
+    return series.astype(str).str.lower().str.contains(needle, regex=False).to_numpy()
+
+def _range_mask(series, term, to_bounds, convert):
+    """Mask for comparisons and ``a..b`` ranges over a numeric or date column."""
+    values = series.to_numpy()
+    if term.op == ":" and ".." in term.value:
+        low, high = term.value.split("..", 1)
+        mask = np.ones(len(series), dtype=bool)
+        if low:
+            mask &= values >= to_bounds(low)[0]
+        if high:
+            mask &= values < to_bounds(high)[1] if convert is None else values <= convert(high)
+        return mask
+    start, end = to_bounds(term.value)
+    ops = {
+        ":": lambda: (values >= start) & (values < end),
+        "=": lambda: (values >= start) & (values < end),
+        ">": lambda: values >= end,
+        ">=": lambda: values >= start,
+        "<": lambda: values < start,
+        "<=": lambda: values < end,
+    }
+    return ops[term.op]()
+
+def compile_query(terms, df, index=None, rows=None):
+    """Evaluate parsed terms against the typed DataFrame as one boolean mask (AND of all terms)."""
+    mask = np.ones(len(df), dtype=bool)
+    for term in terms:
+        if term.field is None:
+            positions = index.search(term.value, rows) if index is not None else None
+            if positions is None:
+                term_mask = np.zeros(len(df), dtype=bool)
+                for col in DEFAULT_COLUMNS:
+                    term_mask |= _text_mask(df[col], term.value)
+            else:
+                term_mask = np.zeros(len(df), dtype=bool)
+                term_mask[positions[positions < len(df)]] = True
+        elif term.field == "Date":
+            dates = df["Date"].to_numpy(dtype="datetime64[ns]")
+            term_mask = _range_mask(pd.Series(dates), term, lambda v: tuple(np.datetime64(t, "ns") for t in _date_period(v)), None)
+        elif term.field in NUMERIC_COLUMNS:
+            if term.op == ":" and ".." not in term.value:
+                term = QueryTerm(term.field, "=", term.value)
+            term_mask = _range_mask(
+                df[term.field], term,
+                lambda v: (_number(v), np.nextafter(_number(v), np.inf)), _number,
+            )
+        else:
+            if term.op not in (":", "="):
+                raise QueryError(f"'{term.op}' only works with numbers and dates")
+            term_mask = _text_mask(df[term.field], term.value)
+        mask &= term_mask
+    return mask
+
+# ---------- Analytics Rollups ----------
+ROLLUP_DIMENSIONS = ["month", "brand", "vendor", "payment"]
+ROLLUP_MEASURES = ["entries", "sticks", "spend", "paid", "outstanding"]
+
+def _rollup_contributions(df) -> pd.DataFrame:
+    """One row per usable entry: its dimension keys and what it adds to each measure."""
+    dates = pd.to_datetime(df["Date"], errors="coerce")
+    usable = dates.notna() & df["Quantity"].notna() & df["TotalCost"].notna()
+    df, dates = df[usable], dates[usable]
+    return pd.DataFrame({
+        "month": dates.dt.to_period("M").dt.to_timestamp(),
+        "brand": df["Brand"].astype(object),
+        "vendor": df["Vendor"].astype(object),
+        "payment": df["PaymentMethod"].astype(object),
+        "entries": 1.0,
+        "sticks": df["Quantity"].astype(float),
+        "spend": df["TotalCost"].astype(float),
+        "paid": df["AmountPaid"].astype(float).fillna(0.0),
+        "outstanding": df["Outstanding"].astype(float).fillna(0.0),
+    })
+
+class Rollups:
+    """Running totals per month, brand, vendor and payment method, adjusted per entry on writes."""
+
+    def __init__(self, df):
+        self.lock = threading.Lock()
+        rows = _rollup_contributions(df)
+        self.overall = rows[ROLLUP_MEASURES].sum().tolist()
+        self.totals = {}
+        for dim in ROLLUP_DIMENSIONS:
+            grouped = rows.groupby(dim, sort=False)[ROLLUP_MEASURES].sum()
+            self.totals[dim] = dict(zip(grouped.index, grouped.to_numpy().tolist()))
+
+    def _apply(self, df, sign: float):
+        rows = _rollup_contributions(df)
+        with self.lock:
+            for record in rows.itertuples(index=False):
+                amounts = [sign * getattr(record, m) for m in ROLLUP_MEASURES]
+                self.overall = [a + b for a, b in zip(self.overall, amounts)]
+                for dim in ROLLUP_DIMENSIONS:
+                    group = self.totals[dim]
+                    key = getattr(record, dim)
+                    totals = [a + b for a, b in zip(group.get(key, [0.0] * len(amounts)), amounts)]
+                    if totals[0] > 0.5:
+                        group[key] = totals
+                    else:
+                        group.pop(key, None)  # last entry of the group removed
+
+    def add(self, df):
+        self._apply(df, 1.0)
+
+    def remove(self, df):
+        self._apply(df, -1.0)
+
+    def frame(self, dim: str) -> pd.DataFrame:
+        """Totals of one dimension as a DataFrame indexed by its keys, in key order."""
+        with self.lock:
+            group = dict(self.totals[dim])
+        frame = pd.DataFrame.from_dict(group, orient="index", columns=ROLLUP_MEASURES)
+        return frame.sort_index()
+
+    def analytics(self):
+        """Chart inputs for the Analytics tab, or None when no entry is usable."""
+        if self.overall[0] < 0.5:
+            return None
+        months, brands, payments = self.frame("month"), self.frame("brand"), self.frame("payment")
+        payment_counts = payments["entries"].astype(int).sort_values(ascending=False, kind="stable")
+        return {
+            "spending": pd.DataFrame({"Date": months.index, "TotalCost": months["spend"].to_numpy()}),
+            "brand_freq": pd.DataFrame({"Brand": brands.index, "Quantity": brands["sticks"].to_numpy()}),
+            "total_outstanding": self.overall[ROLLUP_MEASURES.index("outstanding")],
+            "payment_counts": pd.DataFrame({"PaymentMethod": payment_counts.index, "Count": payment_counts.to_numpy()}),
+            "vendors": self.frame("vendor"),
+        }
+
+def get_rollups(ws, snap) -> Rollups:
+    """The snapshot's analytics rollups, built on first use."""
+    if snap.rollups is None:
+        with _fetch_lock(_snapshot_store(), _sheet_key(ws)):
+            if snap.rollups is None:
+                snap.rollups = Rollups(snap.df)
+    return snap.rollups
+
+# ---------- Credit Ledger ----------
+AGING_BUCKETS = ["0–7 days", "8–30 days", "30+ days"]
+AGING_DAYS = [7, 30]  # upper bound of each bucket but the last
+
+def _ledger_events(df) -> pd.DataFrame:
+    """One row per entry that moves its vendor's balance: day number, vendor, debt and overpayment."""
+    dates = pd.to_datetime(df["Date"], errors="coerce")
+    net = df["TotalCost"].astype(float) - df["AmountPaid"].astype(float).fillna(0.0)
+    moves = (dates.notna() & (net.abs() >= 0.005)).to_numpy()
+    net = net.to_numpy()[moves]
+    return pd.DataFrame({
+        "day": dates.to_numpy(dtype="datetime64[D]")[moves].astype(np.int64),
+        "vendor": df["Vendor"].astype(object).to_numpy()[moves],
+        "debt": np.maximum(net, 0.0),
+        "credit": np.maximum(-net, 0.0),
+    })
+
+class _VendorLedger:
+    """One vendor's balance-moving entries in date order, with running sums of debts and credits."""
+
+    def __init__(self, days, debts, credits):
+        self.days, self.debts, self.credits = list(days), list(debts), list(credits)
+        self.cum_debt, self.cum_credit = [], []
+        self._resum(0)
+
+    def _resum(self, pos: int):
+        """Recompute the running sums from ``pos`` on; appends in date order only touch the tail."""
+        for cum, amounts in ((self.cum_debt, self.debts), (self.cum_credit, self.credits)):
+            base = cum[pos - 1] if pos else 0.0
+            del cum[pos:]
+            cum.extend((base + np.cumsum(amounts[pos:])).tolist())
+
+    def insert(self, day: int, debt: float, credit: float):
+        pos = bisect.bisect_right(self.days, day)
+        self.days.insert(pos, day)
+        self.debts.insert(pos, debt)
+        self.credits.insert(pos, credit)
+        self._resum(pos)
+
+    def remove(self, day: int, debt: float, credit: float):
+        for pos in range(bisect.bisect_left(self.days, day), bisect.bisect_right(self.days, day)):
+            if abs(self.debts[pos] - debt) < 0.005 and abs(self.credits[pos] - credit) < 0.005:
+                del self.days[pos], self.debts[pos], self.credits[pos]
+                self._resum(pos)
+                return
+
+    def balance(self) -> float:
+        """Debts minus payments beyond them; negative when the vendor holds an advance."""
+        return self.cum_debt[-1] - self.cum_credit[-1] if self.days else 0.0
+
+    def aging(self, today: int) -> list:
+        """Debt left unsettled per AGING_BUCKETS, settling oldest debts first (FIFO)."""
+        total, settled = self.cum_debt[-1], self.cum_credit[-1]
+
+        def open_since(day):
+            # Credits pay off the oldest debts, so entries from ``day`` on owe their total less any spill-over
+            k = bisect.bisect_left(self.days, day)
+            before = self.cum_debt[k - 1] if k else 0.0
+            return max(total - max(before, settled), 0.0)
+
+        bounds = [open_since(today - age) for age in AGING_DAYS] + [max(total - settled, 0.0)]
+        return [b - a for a, b in zip([0.0] + bounds[:-1], bounds)]
+
+    def oldest_open(self):
+        """Day number of the oldest debt not yet settled, or None."""
+        k = bisect.bisect_right(self.cum_debt, self.cum_credit[-1] + 0.005)
+        return self.days[k] if k < len(self.days) else None
+
+class CreditLedger:
+    """Per-vendor credit ledgers: running balances, FIFO settlement and aging."""
+
+    def __init__(self, df):
+        self.lock = threading.Lock()
+        events = _ledger_events(df).sort_values("day", kind="stable")
+        self.vendors = {
+            vendor: _VendorLedger(group["day"], group["debt"], group["credit"])
+            for vendor, group in events.groupby("vendor", sort=False)
+        }
+
+    def add(self, df):
+        with self.lock:
+            for event in _ledger_events(df).itertuples(index=False):
+                if event.vendor not in self.vendors:
+                    self.vendors[event.vendor] = _VendorLedger([], [], [])
+                self.vendors[event.vendor].insert(event.day, event.debt, event.credit)
+
+    def remove(self, df):
+        with self.lock:
+            for event in _ledger_events(df).itertuples(index=False):
+                ledger = self.vendors.get(event.vendor)
+                if ledger is None:
+                    continue
+                ledger.remove(event.day, event.debt, event.credit)
+                if not ledger.days:
+                    del self.vendors[event.vendor]
+
+    def summary(self, today: date = None) -> pd.DataFrame:
+        """One row per vendor: balance, unsettled debt by age and the oldest unsettled entry's date."""
+        today = int(np.datetime64(today or date.today(), "D").astype(np.int64))
+        rows = []
+        with self.lock:
+            for vendor, ledger in self.vendors.items():
+                oldest = ledger.oldest_open()
+                rows.append([vendor, round(ledger.balance(), 2), *(round(a, 2) for a in ledger.aging(today)),
+                             None if oldest is None else np.datetime64(oldest, "D")])
+        summary = pd.DataFrame(rows, columns=["Vendor", "Balance", *AGING_BUCKETS, "OldestOpen"])
+        summary["OldestOpen"] = pd.to_datetime(summary["OldestOpen"])
+        return summary.sort_values(["Balance", "Vendor"], ascending=[False, True], ignore_index=True)
+
+    def history(self, vendor) -> pd.DataFrame:
+        """The vendor's running balance at the end of each day it changed."""
+        with self.lock:
+            ledger = self.vendors.get(vendor)
+            if ledger is None:
+                return pd.DataFrame({"Date": pd.to_datetime([]), "Balance": []})
+            days = np.array(ledger.days, dtype=np.int64)
+            balance = np.array(ledger.cum_debt) - np.array(ledger.cum_credit)
+        last_of_day = np.append(days[1:] != days[:-1], True)
+        return pd.DataFrame({"Date": days[last_of_day].astype("datetime64[D]").astype("datetime64[ns]"),
+                             "Balance": balance[last_of_day].round(2)})
+
+def get_ledger(ws, snap) -> CreditLedger:
+    """The snapshot's credit ledger, built on first use."""
+    if snap.ledger is None:
+        with _fetch_lock(_snapshot_store(), _sheet_key(ws)):
+            if snap.ledger is None:
+                snap.ledger = CreditLedger(snap.df)
+    return snap.ledger
+
 def ensure_headers(ws):
     """Ensure the spreadsheet has the correct headers."""
     try:
-        values = ws.get_all_values()
-        if not values:
-            ws.append_row(DEFAULT_COLUMNS)
-        elif values[0] != DEFAULT_COLUMNS:
+        snap = get_snapshot(ws)
+        if not snap.values:
+            ws.append_row(SHEET_COLUMNS)
+            invalidate_snapshot(ws)
+        elif snap.header[:ID_INDEX] != DEFAULT_COLUMNS:
             st.warning("Spreadsheet headers differ from expected schema. Using existing headers.")
+        elif snap.header[ID_INDEX:ID_INDEX + 1] in ([], [""], [ID_COLUMN]) and (not has_row_ids(snap.header) or snap.missing_ids):
+            assign_missing_ids(ws)
+        if snap.parse_failures:
+            details = ", ".join(f"{col} ({n})" for col, n in snap.parse_failures.items())
+            st.warning(f"Some cells could not be parsed and are treated as blank: {details}")
     except Exception as e:
+        _invalidate_on_auth_error(ws, e)
         st.error(f"Failed to verify/create headers. Details: {e}")
         st.stop()
 
-@st.cache_data(ttl=240)
 def load_data(sheet_url_or_title: str):
-    """Load and cache data from Google Sheet as a DataFrame."""
+    """Return the snapshot's typed rows as a DataFrame."""
     ws = open_spreadsheet(sheet_url_or_title)
     if not ws:
         return pd.DataFrame(columns=DEFAULT_COLUMNS)
     
     try:
-        df = pd.DataFrame(ws.get_all_records())
-        if df.empty:
-            return pd.DataFrame(columns=DEFAULT_COLUMNS)
-        
-        # Ensure all expected columns exist
-        for col in DEFAULT_COLUMNS:
-            if col not in df.columns:
-                df[col] = None
-        
-        # Type conversions
-        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-        numeric_cols = ["Quantity", "UnitsPerPack", "PricePerPack", "TotalCost", "AmountPaid", "Outstanding"]
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-        
-        return df[DEFAULT_COLUMNS]
+        return get_snapshot(ws).df
     except Exception as e:
+        _invalidate_on_auth_error(ws, e)
         st.error(f"Failed to load data from Google Sheet. Details: {e}")
         return pd.DataFrame(columns=DEFAULT_COLUMNS)
 
+# ---------- Local Mirror ----------
+MIRROR_SYNC_SECONDS = float(get_setting("mirror_sync_seconds", 30))
+
+class LocalMirror:
+    """SQLite copy of one worksheet, stored as the text the sheet returns, plus an outbox of unpushed writes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        cols = ", ".join(f'"{c}" TEXT' for c in SHEET_COLUMNS)
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS entries (row_num INTEGER NOT NULL, {cols})")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT, row_num INTEGER, payload TEXT)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Mirrors created before row IDs existed
+            self._add_column("entries", f'"{ID_COLUMN}"')
+            self._add_column("outbox", "row_id")
+            self._add_column("outbox", "base")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_row_num ON entries (row_num)")
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS entries_id ON entries ("{ID_COLUMN}")')
+        self._columns = ", ".join(f'"{c}"' for c in SHEET_COLUMNS)
+        self._placeholders = ", ".join("?" * (len(SHEET_COLUMNS) + 1))
+
+    def _add_column(self, table, column):
+        existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        if column.strip('"') not in existing:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT DEFAULT ''")
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def has_data(self) -> bool:
+        with self.lock:
+            return self._meta("last_pull") is not None
+
+    def _values(self) -> list:
+        rows = self.conn.execute(f"SELECT {self._columns} FROM entries ORDER BY row_num").fetchall()
+        return [list(SHEET_COLUMNS)] + [list(r) for r in rows]
+
+    def values(self) -> list:
+        """The mirrored grid, header row first, like get_all_values()."""
+        with self.lock:
+            return self._values()
+
+    def _insert(self, row_num, cells):
+        cells = [_cell_text(c) for c in cells][:len(SHEET_COLUMNS)]
+        cells += [""] * (len(SHEET_COLUMNS) - len(cells))
+        self.conn.execute(f"INSERT INTO entries (row_num, {self._columns}) VALUES ({self._placeholders})", [row_num] + cells)
+
+    def replace_values(self, values, force: bool = False) -> bool:
+        """Replace the mirrored rows with a fresh pull unless local writes are pending; True if the data changed."""
+        width = len(SHEET_COLUMNS)
+        incoming = [list(SHEET_COLUMNS)] + [(r + [""] * width)[:width] for r in values[1:]]
+        with self.lock, self.conn:
+            if not force and self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]:
+                return False
+            changed = self._values() != incoming
+            if changed:
+                self.conn.execute("DELETE FROM entries")
+                for row_num, row in enumerate(incoming[1:], start=2):
+                    self._insert(row_num, row)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('last_pull', ?)", (str(time.time()),))
+            return changed
+
+    def enqueue(self, op: str, row_num, row=None, row_id=None, base=None):
+        """Apply a write to the mirror and record it in the outbox; ``base`` is the row_version() the edit started from."""
+        with self.lock, self.conn:
+            if row_id is not None:
+                found = self.conn.execute(f'SELECT row_num FROM entries WHERE "{ID_COLUMN}" = ?', (row_id,)).fetchone()
+                if found is None:
+                    raise RowNotFoundError(row_id)
+                row_num = found[0]
+            if op == "append":
+                row_num = self.conn.execute("SELECT COALESCE(MAX(row_num), 1) + 1 FROM entries").fetchone()[0]
+                self._insert(row_num, row)
+            elif op == "update":
+                cells = [_cell_text(c) for c in row][:len(SHEET_COLUMNS)]
+                assignments = ", ".join(f'"{c}" = ?' for c in SHEET_COLUMNS[:len(cells)])
+                self.conn.execute(f"UPDATE entries SET {assignments} WHERE row_num = ?", cells + [row_num])
+            elif op == "delete":
+                self.conn.execute("DELETE FROM entries WHERE row_num = ?", (row_num,))
+                self.conn.execute("UPDATE entries SET row_num = row_num - 1 WHERE row_num > ?", (row_num,))
+            self.conn.execute(
+                "INSERT INTO outbox (op, row_num, payload, row_id, base) VALUES (?, ?, ?, ?, ?)",
+                (op, row_num, json.dumps(row), row_id, base),
+            )
+
+    def pending(self, limit: int = 500) -> list:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, op, row_num, payload, row_id, base FROM outbox ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(op_id, op, row_num, json.loads(payload), row_id or None, base or None)
+                for op_id, op, row_num, payload, row_id, base in rows]
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def ack(self, op_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in op_ids])
+
+    def last_pull(self):
+        with self.lock:
+            value = self._meta("last_pull")
+        return float(value) if value else None
+
+class MirrorSynchronizer(threading.Thread):
+    """Background thread that pushes the mirror's outbox to the sheet and pulls remote changes."""
+
+    def __init__(self, ws, mirror: LocalMirror, on_change, interval: float = MIRROR_SYNC_SECONDS):
+        super().__init__(daemon=True, name=f"mirror-sync-{ws.id}")
+        self.ws = ws
+        self.mirror = mirror
+        self.on_change = on_change
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.last_error = None
+        self.conflicts = []  # (row ID, sheet cells, local edit or None for a delete) skipped by push()
+        # The last append may have reached the sheet: it failed, or the process stopped before the ack
+        self.unconfirmed = True
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sync_once()
+
+    def push(self):
+        """Replay pending writes in order; consecutive appends go out as one append_rows call."""
+        ops = self.mirror.pending()
+        i = 0
+        while i < len(ops):
+            op_id, op, row_num, row, row_id, base = ops[i]
+            if op == "append":
+                j = i
+                while j < len(ops) and ops[j][1] == "append":
+                    j += 1
+                run = ops[i:j]
+                if self.unconfirmed:
+                    # Entries that landed before the failure are acknowledged, not sent again
+                    landed = find_row_ids(self.ws, [row_id_of(o[3]) for o in run if row_id_of(o[3])])
+                    self.mirror.ack([o[0] for o in run if row_id_of(o[3]) in landed])
+                    run = [o for o in run if row_id_of(o[3]) not in landed]
+                    self.unconfirmed = False
+                try:
+                    if run:
+                        self.ws.append_rows([o[3] for o in run])
+                except APIError as e:
+                    self.unconfirmed = e.code not in NON_IDEMPOTENT_RETRYABLE_STATUS
+                    raise
+                except Exception:
+                    self.unconfirmed = True
+                    raise
+                self.mirror.ack([o[0] for o in run])
+                i = j
+                continue
+            if row_id is not None:
+                # Rows may have moved on the sheet since the edit; an entry deleted remotely is dropped
+                row_num = find_row_ids(self.ws, [row_id]).get(row_id)
+                if row_num is not None and base is not None:
+                    _, cells = _read_sheet_rows(self.ws, {row_id: row_num})[row_id]
+                    if row_version(cells) != base:
+                        # Changed on the sheet since it was edited here: keep theirs, report ours
+                        self.conflicts = (self.conflicts + [(row_id, cells[:ID_INDEX], row)])[-20:]
+                        row_num = None
+            if row_num is None:
+                pass
+            elif op == "update":
+                batch_update_rows(self.ws, {row_num: row})
+            elif op == "delete":
+                self.ws.delete_rows(row_num)
+            self.mirror.ack([op_id])
+            i += 1
+
+    def sync_once(self):
+        try:
+            self.push()
+            if self.mirror.replace_values(self.ws.get_all_values()):
+                self.on_change()
+            self.last_error = None
+        except Exception as e:  # quota exhaustion, network: keep serving the mirror and retry later
+            self.last_error = e
+
+@st.cache_resource
+def _mirror_registry():
+    """Process-wide mirrors and their synchronizer threads, keyed by worksheet."""
+    return {"lock": threading.Lock(), "mirrors": {}}
+
+def get_mirror(ws):
+    """Return the local mirror for a worksheet, or None when mirroring is disabled or the sheet is not a tracker sheet."""
+    mirror_dir = get_setting("mirror_dir")
+    if not mirror_dir:
+        return None
+    registry = _mirror_registry()
+    key = _sheet_key(ws)
+    with registry["lock"]:
+        if key in registry["mirrors"]:
+            mirror, synchronizer = registry["mirrors"][key]
+            if synchronizer is not None:
+                synchronizer.ws = ws
+            return mirror
+        os.makedirs(mirror_dir, exist_ok=True)
+        mirror = LocalMirror(os.path.join(mirror_dir, f"{ws.spreadsheet_id}_{ws.id}.sqlite"))
+        if not mirror.has_data():
+            values = ws.get_all_values()
+            if not values:
+                ws.append_row(SHEET_COLUMNS)
+            elif values[0][:ID_INDEX] != DEFAULT_COLUMNS:
+                registry["mirrors"][key] = (None, None)
+                return None
+            mirror.replace_values(values or [SHEET_COLUMNS], force=True)
+        store = _snapshot_store()
+
+        def on_change():
+            with store["lock"]:
+                store["snapshots"].pop(key, None)
+
+        synchronizer = MirrorSynchronizer(ws, mirror, on_change)
+        synchronizer.start()
+        registry["mirrors"][key] = (mirror, synchronizer)
+        return mirror
+
+def mirror_status(ws):
+    """Pending outbox size, last pull time and last sync error for the sidebar."""
+    registry = _mirror_registry()
+    mirror, synchronizer = registry["mirrors"].get(_sheet_key(ws), (None, None))
+    if mirror is None:
+        return None
+    return {"pending": mirror.pending_count(), "last_pull": mirror.last_pull(), "error": synchronizer.last_error,
+            "conflicts": synchronizer.conflicts}
+
+# ---------- Write-Behind Queue ----------
+WRITE_QUEUE_DIR = get_setting("write_queue_dir", ".tracker_queue")
+WRITE_BATCH_SIZE = int(get_setting("write_batch_size", 20))
+WRITE_FLUSH_SECONDS = float(get_setting("write_flush_seconds", 5))
+
+class WriteBehindQueue:
+    """Durable SQLite queue of new entries, flushed to the sheet in append_rows batches by a daemon thread."""
+
+    def __init__(self, ws, path: str, on_flush, batch_size: int = WRITE_BATCH_SIZE, interval: float = WRITE_FLUSH_SECONDS):
+        self.ws = ws
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.last_error = None
+        # The last append may have reached the sheet: it failed, or the process stopped before the delete
+        self.unconfirmed = True
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT)")
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"write-behind-{ws.id}")
+        self.thread.start()
+
+    def put(self, row) -> int:
+        """Persist a new entry and return the number of entries waiting."""
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO pending (payload) VALUES (?)", (json.dumps(row),))
+            count = self.conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+        if count >= self.batch_size:
+            self.wake.set()
+        return count
+
+    def pending_rows(self) -> list:
+        with self.lock:
+            return [json.loads(p) for (p,) in self.conn.execute("SELECT payload FROM pending ORDER BY id")]
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def flush(self) -> int:
+        """Send waiting entries to the sheet, ``batch_size`` rows per append_rows call."""
+        sent = 0
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    batch = self.conn.execute(
+                        "SELECT id, payload FROM pending ORDER BY id LIMIT ?", (self.batch_size,)
+                    ).fetchall()
+                if not batch:
+                    return sent
+                if self.unconfirmed:
+                    batch = self._drop_landed(batch)
+                    if not batch:
+                        continue
+                drop_if_changed(self.ws)
+                try:
+                    response = self.ws.append_rows([json.loads(p) for _, p in batch])
+                except APIError as e:
+                    self.unconfirmed = e.code not in NON_IDEMPOTENT_RETRYABLE_STATUS
+                    raise
+                except Exception:
+                    self.unconfirmed = True
+                    raise
+                self.unconfirmed = False
+                with self.lock, self.conn:
+                    self.conn.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i, _ in batch])
+                sent += len(batch)
+                self.on_flush(_appended_row_number(response, last=True), self.pending_count())
+
+    def _drop_landed(self, batch):
+        """Forget entries of ``batch`` whose IDs are already in the sheet and return the rest."""
+        ids = {i: row_id_of(json.loads(p)) for i, p in batch}
+        landed = find_row_ids(self.ws, [row_id for row_id in ids.values() if row_id])
+        self.unconfirmed = False
+        if not landed:
+            return batch
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i, row_id in ids.items() if row_id in landed])
+        invalidate_snapshot(self.ws)
+        return [(i, p) for i, p in batch if ids[i] not in landed]
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.flush()
+                self.last_error = None
+            except Exception as e:  # keep entries queued and retry on the next tick
+                self.last_error = e
+
+@st.cache_resource
+def _write_queue_registry():
+    """Process-wide write-behind queues, keyed by worksheet."""
+    return {"lock": threading.Lock(), "queues": {}}
+
+def get_write_queue(ws):
+    """Return the write-behind queue for a worksheet, or None when disabled or mirrored."""
+    if not WRITE_QUEUE_DIR or get_mirror(ws) is not None:
+        return None
+    registry = _write_queue_registry()
+    key = _sheet_key(ws)
+    with registry["lock"]:
+        queue = registry["queues"].get(key)
+        if queue is None:
+            os.makedirs(WRITE_QUEUE_DIR, exist_ok=True)
+            store = _snapshot_store()
+
+            def on_flush(last_row, still_pending):
+                # Flushed rows were already in the snapshot; drop it if they landed elsewhere.
+                snap = store["snapshots"].get(key)
+                revision = sheet_revision(queue.ws) if snap is not None and snap.revision is not None else None
+                with store["lock"]:
+                    snap = store["snapshots"].get(key)
+                    if snap is not None and last_row != len(snap.values) - still_pending:
+                        store["snapshots"].pop(key, None)
+                    elif snap is not None:
+                        snap.revision = revision
+
+            path = os.path.join(WRITE_QUEUE_DIR, f"{ws.spreadsheet_id}_{ws.id}.sqlite")
+            queue = registry["queues"][key] = WriteBehindQueue(ws, path, on_flush)
+        queue.ws = ws
+        return queue
+
+def flush_pending_entries(ws):
+    """Synchronously push queued entries, e.g. before a write that addresses rows by position."""
+    queue = get_write_queue(ws)
+    if queue is not None:
+        queue.flush()
+
+# ---------- Row IDs ----------
+class RowNotFoundError(LookupError):
+    """An entry addressed by ID no longer exists, e.g. someone else deleted it."""
+
+    def __str__(self):
+        return f"entry {self.args[0]} no longer exists; it may have been deleted elsewhere"
+
+def new_row_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+def _id_column_letter() -> str:
+    return rowcol_to_a1(1, ID_INDEX + 1)[:-1]
+
+def find_row_ids(ws: "WorksheetBackend", row_ids) -> dict:
+    """Current 1-based sheet rows of the given IDs, reading only the ID column."""
+    wanted = set(row_ids)
+    column = ws.col_values(ID_INDEX + 1)
+    return {cell: row_num for row_num, cell in enumerate(column, start=1) if row_num > 1 and cell in wanted}
+
+def _read_sheet_rows(ws, rows_by_id: dict) -> dict:
+    """``{row_id: (row, cells)}`` for the given 1-based rows, in one batched read."""
+    live = ws.batch_get([_row_range(row_num, ID_INDEX + 1) for row_num in rows_by_id.values()])
+    return {row_id: (row_num, list(cells[0]) if cells else []) for (row_id, row_num), cells in zip(rows_by_id.items(), live)}
+
+def read_rows(ws: "WorksheetBackend", row_ids) -> dict:
+    """Current sheet row and cells of the given IDs, as ``{row_id: (row, cells)}``; missing IDs are left out."""
+    snap = get_snapshot(ws)
+    guesses = {row_id: snap.row_ids[row_id] + 2 for row_id in row_ids if row_id in snap.row_ids}
+    if guesses and len(guesses) == len(set(row_ids)):
+        rows = _read_sheet_rows(ws, guesses)
+        if all(row_id_of(cells) == row_id for row_id, (_, cells) in rows.items()):
+            return rows
+    invalidate_snapshot(ws)
+    found = find_row_ids(ws, row_ids)
+    return _read_sheet_rows(ws, found) if found else {}
+
+def resolve_rows(ws, row_ids) -> dict:
+    """``{row_id: (row, cells)}`` for a write, raising RowNotFoundError for any ID that is gone."""
+    if get_mirror(ws):
+        snap = get_snapshot(ws)
+        rows = {row_id: (snap.row_ids[row_id] + 2, snap.values[snap.row_ids[row_id] + 1])
+                for row_id in row_ids if row_id in snap.row_ids}
+    else:
+        flush_pending_entries(ws)
+        rows = read_rows(ws, row_ids)
+    for row_id in row_ids:
+        if row_id not in rows:
+            raise RowNotFoundError(row_id)
+    return rows
+
+def row_version(row) -> str:
+    """Version stamp of an entry: the content hash of its data cells (ID excluded)."""
+    return row_fingerprint(list(row)[:ID_INDEX])
+
+class ConflictError(Exception):
+    """Entries changed on the sheet since the editor loaded them; ``current`` holds their cells now."""
+
+    def __init__(self, current: dict):
+        super().__init__(f"{len(current)} entr{'y' if len(current) == 1 else 'ies'} changed since loaded")
+        self.current = current
+
+def check_versions(ws, rows: dict, expected: dict):
+    """Raise ConflictError if any entry no longer matches the row_version() its editor saw."""
+    conflicts = {row_id: cells[:ID_INDEX] for row_id, (_, cells) in rows.items()
+                 if row_id in (expected or {}) and row_version(cells) != expected[row_id]}
+    if conflicts:
+        invalidate_snapshot(ws)
+        raise ConflictError(conflicts)
+
+def row_diff(current, mine) -> list:
+    """Cells that differ between the entry on the sheet and an edit of it, for display."""
+    diff = []
+    for i, col in enumerate(DEFAULT_COLUMNS):
+        theirs = current[i] if i < len(current) else ""
+        ours = _cell_text(mine[i]) if i < len(mine) else ""
+        if _cell_key(theirs) != _cell_key(ours):
+            diff.append({"Column": col, "Now in sheet": theirs, "Your change": ours})
+    return diff
+
+def _row_runs(row_nums):
+    """Group ascending 1-based row numbers into ``(first, last)`` runs of consecutive rows."""
+    runs = []
+    for row_num in row_nums:
+        if runs and runs[-1][1] == row_num - 1:
+            runs[-1][1] = row_num
+        else:
+            runs.append([row_num, row_num])
+    return [tuple(run) for run in runs]
+
+def assign_missing_ids(ws: "WorksheetBackend"):
+    """Add the ID header if needed and write new IDs into rows lacking one, re-checking each row first."""
+    values = ws.get_all_values()
+    if not values:
+        return
+    needs_header = not has_row_ids(values[0])
+    targets = [row_num for row_num, row in enumerate(values[1:], start=2)
+               if not row_id_of(row) and any(row[:ID_INDEX])]
+    if not targets and not needs_header:
+        return
+
+    letter = _id_column_letter()
+    runs = _row_runs(targets)
+    live = ws.batch_get([f"A{first}:{letter}{last}" for first, last in runs]) if runs else []
+    width = ID_INDEX + 1
+    new_ids = {}
+    for (first, last), cells in zip(runs, live):
+        cells = list(cells) + [[]] * (last - first + 1 - len(cells))
+        for row_num, row in zip(range(first, last + 1), cells):
+            row = (list(row) + [""] * width)[:width]
+            if row[:ID_INDEX] == (values[row_num - 1] + [""] * width)[:ID_INDEX] and not row[ID_INDEX]:
+                new_ids[row_num] = new_row_id()
+
+    data = [{"range": f"{letter}1", "values": [[ID_COLUMN]]}] if needs_header else []
+    data += [{"range": f"{letter}{first}:{letter}{last}", "values": [[new_ids[r]] for r in range(first, last + 1)]}
+             for first, last in _row_runs(sorted(new_ids))]
+    if data:
+        ws.batch_update(data, raw=True)
+    mirror = get_mirror(ws)
+    if mirror and data:
+        mirror.replace_values(ws.get_all_values())
+    invalidate_snapshot(ws)
+
+def batch_update_entries(ws, rows_by_id: dict, expected: dict = None):
+    """Overwrite entries addressed by ID with one batched write, refusing if any changed since ``expected``."""
+    rows = resolve_rows(ws, list(rows_by_id))
+    check_versions(ws, rows, expected)
+    rows_by_index = {rows[row_id][0]: row for row_id, row in rows_by_id.items()}
+    mutate = lambda snap: snapshot_with_updated(snap, rows_by_index)
+    mirror = get_mirror(ws)
+    if mirror:
+        for row_id, row in rows_by_id.items():
+            mirror.enqueue("update", None, row, row_id, base=(expected or {}).get(row_id))
+        sync_after_write(ws, mutate, verify=False)
+    else:
+        drop_if_changed(ws)
+        batch_update_rows(ws, rows_by_index)
+        sync_after_write(ws, mutate)
+
+# ---------- Data Operations ----------
+def compute_totals(quantity, units_per_pack, price_per_pack, amount_paid):
+    """TotalCost and Outstanding as the entry forms compute them, element-wise on arrays too."""
+    total_cost = quantity / units_per_pack * price_per_pack
+    return total_cost, np.maximum(total_cost - amount_paid, 0.0)
+
+def append_entries(ws, rows):
+    """Append several complete rows with one request and fold them into the snapshot."""
+    mutate = lambda snap: snapshot_with_appended(snap, rows)
+    mirror = get_mirror(ws)
+    if mirror:
+        for row in rows:
+            mirror.enqueue("append", None, row)
+        sync_after_write(ws, mutate, verify=False)
+    else:
+        flush_pending_entries(ws)
+        drop_if_changed(ws)
+        response = ws.append_rows(rows)
+        sync_after_write(ws, mutate, _appended_row_number(response, last=True))
+
 def append_data(ws, row):
     """Append a new row to the spreadsheet."""
     try:
-        ws.append_row(row)
-        load_data.clear()
+        if has_row_ids(get_snapshot(ws).header):
+            row = list(row) + [new_row_id()]
+        mutate = lambda snap: snapshot_with_appended(snap, [row])
+        mirror = get_mirror(ws)
+        queue = get_write_queue(ws)
+        if mirror:
+            mirror.enqueue("append", None, row)
+            sync_after_write(ws, mutate, verify=False)
+        elif queue is not None:
+            queue.put(row)
+            sync_after_write(ws, mutate, verify=False)
+        else:
+            drop_if_changed(ws)
+            response = ws.append_row(row)
+            sync_after_write(ws, mutate, _appended_row_number(response))
         st.toast("✅ Entry added", icon="✅")
         st.rerun()
     except Exception as e:
+        _invalidate_on_auth_error(ws, e)
         st.error(f"Failed to add entry. Details: {e}")
 
-def update_data(ws, idx_1based, row):
-    """Update a row in the spreadsheet."""
+def update_data(ws, idx_1based, row, row_id=None, expected=None):
+    """Update a row in the spreadsheet, found by ``row_id`` when given and refused if it changed since ``expected``."""
     try:
-        ws.delete_rows(idx_1based)
-        ws.insert_row(row, idx_1based)
-        load_data.clear()
+        if row_id is not None:
+            batch_update_entries(ws, {row_id: row}, {row_id: expected} if expected else None)
+        else:
+            mutate = lambda snap: snapshot_with_updated(snap, {idx_1based: row})
+            mirror = get_mirror(ws)
+            if mirror:
+                mirror.enqueue("update", idx_1based, row)
+                sync_after_write(ws, mutate, verify=False)
+            else:
+                flush_pending_entries(ws)
+                drop_if_changed(ws)
+                batch_update_rows(ws, {idx_1based: row})
+                sync_after_write(ws, mutate)
         st.toast("✏️ Entry updated", icon="✏️")
         st.rerun()
+    except ConflictError as e:
+        st.session_state["edit_conflict"] = {"op": "update", "row_id": row_id, "row": list(row), "current": e.current[row_id]}
+        st.rerun()
     except Exception as e:
+        _invalidate_on_auth_error(ws, e)
         st.error(f"Failed to update entry. Details: {e}")
 
-def delete_data(ws, idx_1based):
-    """Delete a row from the spreadsheet."""
+def delete_data(ws, idx_1based, row_id=None, expected=None):
+    """Delete a row from the spreadsheet, found by ``row_id`` when given and refused if it changed since ``expected``."""
     try:
-        ws.delete_rows(idx_1based)
-        load_data.clear()
+        if row_id is not None:
+            rows = resolve_rows(ws, [row_id])
+            check_versions(ws, rows, {row_id: expected} if expected else None)
+            idx_1based = rows[row_id][0]
+        mutate = lambda snap: snapshot_with_deleted(snap, idx_1based)
+        mirror = get_mirror(ws)
+        if mirror:
+            mirror.enqueue("delete", idx_1based, row_id=row_id, base=expected)
+            sync_after_write(ws, mutate, verify=False)
+        else:
+            flush_pending_entries(ws)
+            drop_if_changed(ws)
+            ws.delete_rows(idx_1based)
+            sync_after_write(ws, mutate)
         st.toast("🗑️ Entry deleted", icon="🗑️")
         st.rerun()
+    except ConflictError as e:
+        st.session_state["edit_conflict"] = {"op": "delete", "row_id": row_id, "row": None, "current": e.current[row_id]}
+        st.rerun()
     except Exception as e:
+        _invalidate_on_auth_error(ws, e)
         st.error(f"Failed to delete entry. Details: {e}")
 
-def search_data(ws, keyword: str):
-    """Search rows for a keyword and return matching rows with their indices."""
+def search_data(ws, keyword: str, snap=None):
+    """Return the snapshot positions of rows matching a keyword or query."""
+    none = np.empty(0, dtype=np.int64)
     try:
-        data = ws.get_all_values()
-        matches = [(i, row) for i, row in enumerate(data, start=1) if i > 1 and any(keyword.lower() in str(cell).lower() for cell in row)]
-        return matches
+        snap = get_snapshot(ws) if snap is None else snap
+        rows = snap.values[1:]
+        terms = parse_query(keyword)
+        if not terms:
+            return none
+        if is_structured(terms) or len(terms) > 1:
+            return np.flatnonzero(compile_query(terms, snap.df, get_search_index(ws, snap), rows))
+        # A single word or quoted phrase, without its quotes
+        text = terms[0].value
+        positions = get_search_index(ws, snap).search(text, rows)
+        if positions is None:
+            width = ID_INDEX if has_row_ids(snap.header) else None
+            positions = np.array([p for p, row in enumerate(rows) if any(text.lower() in str(cell).lower() for cell in row[:width])],
+                                 dtype=np.int64)
+        return positions[positions < len(rows)]
+    except QueryError as e:
+        st.warning(f"Could not understand the search: {e}")
+        return none
     except Exception as e:
+        _invalidate_on_auth_error(ws, e)
         st.error(f"Failed to search data. Details: {e}")
-        return []
+        return none
+
+# ---------- Bulk Import ----------
+IMPORT_CHUNK_ROWS = int(get_setting("import_chunk_rows", 5000))
+IMPORT_BATCH_SIZE = int(get_setting("import_batch_size", 500))
+# strftime format for dates that are not ISO, e.g. "%m/%d/%Y"; without it they are read day first
+IMPORT_DATE_FORMAT = get_setting("import_date_format")
+# Columns an entry is recognised by when deduplicating; totals are derived from these
+IMPORT_IDENTITY = [c for c in DEFAULT_COLUMNS if c not in ("TotalCost", "Outstanding")]
+
+class ImportFileError(ValueError):
+    """An uploaded file that cannot be read as a table of entries."""
+
+def _column_key(name) -> str:
+    return re.sub(r"[^a-z]", "", str(name).lower())
+
+IMPORT_ALIASES = {**{_column_key(c): c for c in DEFAULT_COLUMNS}, **QUERY_FIELDS}
+
+def read_import_chunks(file, name: str, chunk_rows: int = IMPORT_CHUNK_ROWS):
+    """Yield an uploaded CSV or XLSX file as DataFrames of at most ``chunk_rows`` rows."""
+    if name.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportFileError("Reading Excel files needs the openpyxl package; upload a CSV instead.")
+        sheet = load_workbook(file, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = ["" if c is None else str(c).strip() for c in next(rows, ())]
+        total = max((sheet.max_row or 0) - 1, 1)
+        read, buffer = 0, []
+        for row in rows:
+            buffer.append((list(row) + [None] * len(header))[:len(header)])
+            if len(buffer) == chunk_rows:
+                read += len(buffer)
+                chunk = pd.DataFrame(buffer, columns=header, dtype=object)
+                chunk.attrs["progress"] = min(read / total, 1.0)
+                yield chunk
+                buffer = []
+        if buffer:
+            chunk = pd.DataFrame(buffer, columns=header, dtype=object)
+            chunk.attrs["progress"] = 1.0
+            yield chunk
+        return
+    size = getattr(file, "size", None)
+    try:
+        for chunk in pd.read_csv(file, chunksize=chunk_rows, dtype=str, keep_default_na=False,
+                                 skipinitialspace=True, skip_blank_lines=False):
+            chunk.attrs["progress"] = min(file.tell() / size, 1.0) if size else 0.0
+            yield chunk
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ImportFileError(f"Could not read the CSV file: {e}")
+
+def _parse_import_dates(cells):
+    """Parse imported dates, returning ``(dates, ambiguous)``; non-ISO dates use IMPORT_DATE_FORMAT, else day first."""
+    dates = pd.to_datetime(cells, format="ISO8601", errors="coerce")
+    rest = dates.isna() & (cells != "") & ~cells.str.match(r"\d{4}\D")
+    ambiguous = pd.Series(False, index=cells.index)
+    if IMPORT_DATE_FORMAT:
+        dates[rest] = pd.to_datetime(cells[rest], format=IMPORT_DATE_FORMAT, errors="coerce")
+    elif rest.any():
+        day_first = pd.to_datetime(cells[rest], format="mixed", dayfirst=True, errors="coerce")
+        month_first = pd.to_datetime(cells[rest], format="mixed", dayfirst=False, errors="coerce")
+        ambiguous[rest] = day_first.notna() & month_first.notna() & (day_first != month_first)
+        dates[rest] = day_first.where(~ambiguous[rest])
+    return dates, ambiguous.to_numpy()
+
+def normalize_chunk(chunk, first_line: int = 2):
+    """Validate imported rows and complete them like the form; returns ``(rows, errors)``."""
+    columns = {}
+    for name in chunk.columns:
+        target = IMPORT_ALIASES.get(_column_key(name))
+        if target is not None:
+            columns.setdefault(target, name)
+    if "Date" not in columns or "Brand" not in columns:
+        raise ImportFileError("The file needs at least a Date and a Brand column.")
+
+    def text(col):
+        if col not in columns:
+            return pd.Series("", index=chunk.index)
+        return chunk[columns[col]].map(lambda v: "" if v is None or (isinstance(v, float) and np.isnan(v)) else str(v)).str.strip()
+
+    def number(col, default):
+        cells = text(col)
+        return pd.to_numeric(cells.where(cells != "", str(default)).str.replace(",", ""), errors="coerce").to_numpy(dtype=float)
+
+    dates, ambiguous = _parse_import_dates(text("Date"))
+    brand, vendor, notes = text("Brand"), text("Vendor"), text("Notes")
+    quantity, units = number("Quantity", 1), number("UnitsPerPack", 20)
+    price, paid = number("PricePerPack", 0), number("AmountPaid", 0)
+    payment = text("PaymentMethod").str.capitalize().replace("", "Cash")
+
+    blank = (chunk.astype(str).apply(lambda col: col.str.strip().isin(["", "None", "nan"]))).all(axis=1).to_numpy()
+    checks = [
+        (dates.isna().to_numpy() & ~ambiguous, "date is missing or not a date"),
+        (ambiguous, "date could be day or month first; use YYYY-MM-DD"),
+        ((brand == "").to_numpy(), "brand is required"),
+        (~(quantity >= 1) | (quantity % 1 != 0), "quantity must be a whole number of at least 1"),
+        (~(units >= 1) | (units % 1 != 0), "units per pack must be a whole number of at least 1"),
+        (~(price >= 0), "price per pack must be a number of at least 0"),
+        (~(paid >= 0), "amount paid must be a number of at least 0"),
+        (~payment.isin(["Cash", "Credit"]).to_numpy(), "payment method must be Cash or Credit"),
+    ]
+    invalid = np.zeros(len(chunk), dtype=bool)
+    messages = [[] for _ in range(len(chunk))]
+    for mask, message in checks:
+        mask = mask & ~blank
+        invalid |= mask
+        for i in np.flatnonzero(mask):
+            messages[i].append(message)
+    errors = [(first_line + int(i), "; ".join(messages[i])) for i in np.flatnonzero(invalid)]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total, outstanding = compute_totals(quantity, units, price, paid)
+    keep = np.flatnonzero(~invalid & ~blank)
+    day = dates.dt.strftime(DATE_FORMAT).to_numpy()
+    rows = [
+        [day[i], brand.iat[i], int(quantity[i]), int(units[i]), float(price[i]), float(total[i]),
+         payment.iat[i], float(paid[i]), float(outstanding[i]), vendor.iat[i], notes.iat[i]]
+        for i in keep
+    ]
+    return rows, errors
+
+def import_fingerprint(row) -> str:
+    """Hash of the cells an entry is entered with, for recognising it in the sheet."""
+    return row_fingerprint([row[DEFAULT_COLUMNS.index(c)] if DEFAULT_COLUMNS.index(c) < len(row) else ""
+                            for c in IMPORT_IDENTITY])
+
+def import_entries(ws, chunks, skip_existing: bool = True, batch_size: int = IMPORT_BATCH_SIZE):
+    """Append validated imported rows in batches, skipping entries already in the sheet; yields progress."""
+    snap = get_snapshot(ws)
+    existing = Counter(import_fingerprint(row) for row in snap.values[1:]) if skip_existing else Counter()
+    with_ids = has_row_ids(snap.header)
+    status = {"read": 0, "written": 0, "skipped": 0, "invalid": 0, "errors": [], "progress": 0.0}
+    pending = []
+    for chunk in chunks:
+        rows, errors = normalize_chunk(chunk, status["read"] + 2)
+        status["read"] += len(chunk)
+        status["invalid"] += len(errors)
+        status["errors"].extend(errors[:max(0, 500 - len(status["errors"]))])
+        for row in rows:
+            fingerprint = import_fingerprint(row)
+            if existing[fingerprint] > 0:
+                existing[fingerprint] -= 1
+                status["skipped"] += 1
+            else:
+                pending.append(row + [new_row_id()] if with_ids else row)
+        while len(pending) >= batch_size:
+            append_entries(ws, pending[:batch_size])
+            status["written"] += batch_size
+            pending = pending[batch_size:]
+            yield status
+        status["progress"] = chunk.attrs.get("progress", 0.0)
+        yield status
+    if pending:
+        append_entries(ws, pending)
+        status["written"] += len(pending)
+    status["progress"] = 1.0
+    yield status
+
+# ---------- Export ----------
+EXPORT_CHUNK_ROWS = int(get_setting("export_chunk_rows", 50000))
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+EXCEL_MAX_ROWS = 1_048_575  # one row of the sheet is the header
+
+class ExportError(ValueError):
+    """An export that cannot be produced in the requested format."""
+
+def export_mask(df, start=None, end=None, brands=(), vendors=()):
+    """Rows within [start, end] (dates, inclusive) of the given brands and vendors; empty filters match all."""
+    mask = np.ones(len(df), dtype=bool)
+    dates = df["Date"].to_numpy(dtype="datetime64[ns]")
+    if start is not None:
+        mask &= dates >= np.datetime64(start, "ns")
+    if end is not None:
+        mask &= dates < np.datetime64(end, "ns") + np.timedelta64(1, "D")
+    if brands:
+        mask &= df["Brand"].isin(brands).to_numpy()
+    if vendors:
+        mask &= df["Vendor"].isin(vendors).to_numpy()
+    return mask
+
+def _export_chunks(df, positions, chunk_rows):
+    for i in range(0, len(positions), chunk_rows):
+        chunk = df.iloc[positions[i:i + chunk_rows]]
+        yield chunk.astype({col: object for col in CATEGORICAL_COLUMNS})
+
+def write_export(df, positions, fmt: str, out, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Write the selected rows to a binary file object as ``fmt``, ``chunk_rows`` at a time."""
+    if fmt == "CSV":
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+        for i, chunk in enumerate(_export_chunks(df, positions, chunk_rows)):
+            chunk.to_csv(text, index=False, header=i == 0, date_format=DATE_FORMAT)
+        if not len(positions):
+            text.write(",".join(DEFAULT_COLUMNS) + "\n")
+        text.flush()
+        text.detach()
+    elif fmt == "Parquet":
+        if not _has_pyarrow():
+            raise ExportError("Parquet export needs the pyarrow package.")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.Schema.from_pandas(df.iloc[:0].astype({col: object for col in CATEGORICAL_COLUMNS}), preserve_index=False)
+        schema = pa.schema([f.with_type(pa.string()) if f.name in CATEGORICAL_COLUMNS + ["Notes"] else f for f in schema])
+        with pq.ParquetWriter(out, schema) as writer:
+            for chunk in _export_chunks(df, positions, chunk_rows):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    elif fmt == "Excel":
+        if len(positions) > EXCEL_MAX_ROWS:
+            raise ExportError(f"Excel sheets hold at most {EXCEL_MAX_ROWS:,} rows; narrow the filters or use CSV/Parquet.")
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ExportError("Excel export needs the openpyxl package.")
+        book = Workbook(write_only=True)
+        sheet = book.create_sheet("Entries")
+        sheet.append(DEFAULT_COLUMNS)
+        for chunk in _export_chunks(df, positions, chunk_rows):
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False):
+                sheet.append(list(row))
+        book.save(out)
+    else:
+        raise ExportError(f"Unknown export format: {fmt}")
+
+def export_file(df, positions, fmt: str):
+    """Export into an anonymous temporary file, rewound for reading."""
+    out = tempfile.TemporaryFile()
+    write_export(df, positions, fmt, out)
+    out.seek(0)
+    return out
 
 # ---------- UI Components ----------
+@st.fragment
 def add_entry_tab(ws):
-    """Render the 'Add Entry' tab."""
+    """Render the 'Add Entry' tab as a fragment."""
     st.subheader("Add New Log")
     col1, col2, col3 = st.columns(3)
     
@@ -153,8 +2125,7 @@ def add_entry_tab(ws):
     
     if units_per_pack > 0:
         packs_purchased = quantity / units_per_pack
-        total_cost = packs_purchased * price_per_pack
-        outstanding = max(total_cost - amount_paid, 0.0)
+        total_cost, outstanding = compute_totals(quantity, units_per_pack, price_per_pack, amount_paid)
         
         st.divider()
         st.markdown("### 💰 Calculation Breakdown")
@@ -177,28 +2148,185 @@ def add_entry_tab(ws):
             else:
                 st.error("Brand name is required.")
 
+VIEW_CACHE_SIZE = int(get_setting("view_cache_size", 64))
+
+@st.cache_resource
+def _view_cache():
+    """Process-wide LRU of values derived from one data version (figures, sort orders, filters)."""
+    return {"lock": threading.Lock(), "entries": OrderedDict()}
+
+def cached_for_version(ws, snap, key: tuple, build):
+    """Return ``build()`` for this worksheet's data version, computing it at most once across sessions."""
+    cache = _view_cache()
+    key = (_sheet_key(ws), snap.version) + key
+    with cache["lock"]:
+        if key in cache["entries"]:
+            cache["entries"].move_to_end(key)
+            return cache["entries"][key]
+    value = build()
+    with cache["lock"]:
+        cache["entries"][key] = value
+        while len(cache["entries"]) > VIEW_CACHE_SIZE:
+            cache["entries"].popitem(last=False)
+    return value
+
+def table_positions(ws, snap, query: str, sort_by: str, descending: bool):
+    """Row positions matching ``query``, ordered by ``sort_by``; cached per data version."""
+    def sort_order():
+        series = snap.df[sort_by]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object)
+        order = series.reset_index(drop=True).sort_values(ascending=not descending, na_position="last", kind="stable")
+        return order.index.to_numpy()
+
+    def matching():
+        terms = parse_query(query)
+        return compile_query(terms, snap.df, get_search_index(ws, snap), snap.values[1:])
+
+    def build():
+        order = cached_for_version(ws, snap, ("sort", sort_by, descending), sort_order)
+        if not query.strip():
+            return order
+        mask = cached_for_version(ws, snap, ("filter", query), matching)
+        return order[mask[order]]
+
+    return cached_for_version(ws, snap, ("table", query, sort_by, descending), build)
+
+# Formatting is applied by the browser; the frame keeps its numeric and date dtypes so it sorts correctly
+DISPLAY_COLUMN_CONFIG = {
+    "Date": st.column_config.DateColumn("Date", format="YYYY-MM-DD"),
+    "Quantity": st.column_config.NumberColumn("Quantity", format="%d"),
+    "UnitsPerPack": st.column_config.NumberColumn("UnitsPerPack", format="%d"),
+    **{col: st.column_config.NumberColumn(col, format="₹%.2f")
+       for col in ["PricePerPack", "TotalCost", "AmountPaid", "Outstanding"]},
+}
+
+def data_table(ws, snap):
+    """Paginated view of the entries: filtered, sorted and formatted one page at a time."""
+    col_filter, col_sort, col_order, col_size = st.columns([4, 2, 1, 1])
+    query = col_filter.text_input("Filter", key="table_filter", placeholder="vendor:raju date:2026-03 outstanding>0",
+                                  help="Same syntax as the search box below.")
+    sort_by = col_sort.selectbox("Sort by", DEFAULT_COLUMNS, key="table_sort")
+    descending = col_order.toggle("Newest first" if sort_by == "Date" else "Descending", value=True, key="table_desc")
+    page_size = col_size.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="table_page_size")
+    try:
+        positions = table_positions(ws, snap, query, sort_by, descending)
+    except QueryError as e:
+        st.warning(f"Could not understand the filter: {e}")
+        return
+    total = len(positions)
+    pages = max(1, -(-total // page_size))
+    if st.session_state.get("table_page", 1) > pages:
+        st.session_state["table_page"] = pages
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, step=1, key="table_page")
+    start = (page - 1) * page_size
+    page_rows = cached_for_version(ws, snap, ("page", query, sort_by, descending, start, page_size),
+                                   lambda: snap.df.iloc[positions[start:start + page_size]])
+    st.dataframe(page_rows, column_config=DISPLAY_COLUMN_CONFIG, use_container_width=True, hide_index=True)
+    shown = f"{start + 1:,}–{start + len(page_rows):,}" if total else "0"
+    filtered = f" matching the filter (of {len(snap.df):,})" if query.strip() else ""
+    st.caption(f"Showing {shown} of {total:,} entries{filtered}")
+
+def conflict_panel(ws):
+    """Show an edit or delete that was refused because the entry changed meanwhile."""
+    conflict = st.session_state.get("edit_conflict")
+    if not conflict:
+        return
+    st.error("Someone else changed this entry after you opened it, so your change was not saved.")
+    if conflict["op"] == "update":
+        st.dataframe(pd.DataFrame(row_diff(conflict["current"], conflict["row"])), use_container_width=True, hide_index=True)
+        apply_label = "✏️ Apply my change anyway"
+    else:
+        st.write("**The entry now reads:**")
+        st.json(dict(zip(DEFAULT_COLUMNS, conflict["current"])))
+        apply_label = "🗑️ Delete it anyway"
+    col_apply, col_discard = st.columns(2)
+    if col_apply.button(apply_label, key="conflict_apply", type="primary"):
+        del st.session_state["edit_conflict"]
+        expected = row_version(conflict["current"])
+        if conflict["op"] == "update":
+            update_data(ws, None, conflict["row"], conflict["row_id"], expected)
+        else:
+            delete_data(ws, None, conflict["row_id"], expected)
+    if col_discard.button("↩️ Discard my change", key="conflict_discard"):
+        del st.session_state["edit_conflict"]
+        st.rerun()
+
+@st.fragment
+def edit_entry_form(ws, sel_idx_1based, sel_row, sel_id, sel_key, base_key):
+    """Edit form for the selected entry; its widgets rerun only this fragment."""
+    with st.expander("✏️ Edit Entry", expanded=True):
+        try:
+            date_value = pd.to_datetime(sel_row[0]).date() if sel_row[0] else date.today()
+        except:
+            date_value = date.today()
+
+        e_date = st.date_input("Date", value=date_value, key=f"edit_date_{sel_key}")
+        e_brand = st.text_input("Brand", sel_row[1] if len(sel_row) > 1 else "", key=f"edit_brand_{sel_key}")
+        e_qty = st.number_input("Quantity (sticks)", min_value=1, value=int(float(sel_row[2] or 1)), step=1, key=f"edit_qty_{sel_key}")
+        e_units = st.number_input("Units per pack", min_value=1, value=int(float(sel_row[3] or 20)), step=1, key=f"edit_units_{sel_key}")
+        e_price = st.number_input("Price per pack (₹)", min_value=0.0, value=float(sel_row[4] or 0.0), step=0.5, format="%.2f", key=f"edit_price_{sel_key}")
+        e_payment = st.selectbox("Payment Method", ["Cash", "Credit"], index=0 if sel_row[6] == "Cash" else 1, key=f"edit_payment_{sel_key}")
+        e_paid = st.number_input("Amount paid (₹)", min_value=0.0, value=float(sel_row[7] or 0.0), step=0.5, format="%.2f", key=f"edit_paid_{sel_key}")
+        e_vendor = st.text_input("Vendor (optional)", sel_row[9] if len(sel_row) > 9 else "", key=f"edit_vendor_{sel_key}")
+        e_notes = st.text_area("Notes (optional)", sel_row[10] if len(sel_row) > 10 else "", key=f"edit_notes_{sel_key}")
+
+        if e_units > 0:
+            e_packs = e_qty / e_units
+            e_total, e_outstanding = compute_totals(e_qty, e_units, e_price, e_paid)
+
+            st.markdown("### 💰 Edited Calculation Breakdown")
+            col_ecalc1, col_ecalc2 = st.columns(2)
+            with col_ecalc1:
+                st.info(f"Packs: {e_qty} ÷ {e_units} = {e_packs:.3f} packs\n\n"
+                        f"Total Cost: {e_packs:.3f} × ₹{e_price:.2f} = ₹{e_total:.2f}")
+            with col_ecalc2:
+                st.success(f"Outstanding: ₹{e_total:.2f} - ₹{e_paid:.2f} = ₹{e_outstanding:.2f}\n\n"
+                           f"Cost per stick: ₹{e_total/e_qty:.2f}")
+
+            if st.button("💾 Update Entry", key=f"update_{sel_key}", type="primary"):
+                if e_brand.strip():
+                    row = [
+                        str(e_date), e_brand.strip(), int(e_qty), int(e_units),
+                        float(e_price), float(e_total), e_payment,
+                        float(e_paid), float(e_outstanding), e_vendor.strip(), e_notes.strip()
+                    ]
+                    update_data(ws, sel_idx_1based, row, sel_id, st.session_state.pop(base_key, None))
+                else:
+                    st.error("Brand name is required.")
+
+SEARCH_CHOICES = 500  # matches offered in the entry picker
+
 def view_edit_delete_tab(ws, df):
     """Render the 'View / Edit / Delete' tab."""
     st.subheader("📊 Your Data")
     
     if not df.empty:
-        display_df = df.copy()
-        display_df["Date"] = pd.to_datetime(display_df["Date"]).dt.strftime("%Y-%m-%d")
-        for col in ["PricePerPack", "TotalCost", "AmountPaid", "Outstanding"]:
-            display_df[col] = display_df[col].apply(lambda x: f"₹{x:.2f}" if pd.notnull(x) else "₹0.00")
-        st.dataframe(display_df, use_container_width=True, hide_index=True)
+        data_table(ws, get_snapshot(ws))
     else:
         st.info("No data found. Add entries to view.")
     
     st.divider()
     st.markdown("### 🔍 Search to Edit/Delete")
-    keyword = st.text_input("Search keyword (case-insensitive)", key="search_keyword")
+    conflict_panel(ws)
+    keyword = st.text_input(
+        "Search keyword (case-insensitive)", key="search_keyword",
+        placeholder="raju   or   vendor:raju payment:credit outstanding>100 date:2026-03..2026-04",
+        help="Plain text matches any cell. Filters: brand:, vendor:, notes:, payment: (text); "
+             "date:YYYY[-MM[-DD]] or date:FROM..TO; qty, units, price, total, paid, outstanding "
+             "with :N, :A..B, >, >=, <, <=. Terms are combined with AND; quote phrases with \"...\".",
+    )
     
     if keyword:
-        matches = search_data(ws, keyword)
-        if not matches:
+        snap = get_snapshot(ws)
+        matches = search_data(ws, keyword, snap)
+        if not len(matches):
             st.info("No matching entries found.")
         else:
+            if len(matches) > SEARCH_CHOICES:
+                st.caption(f"{len(matches):,} entries match; showing the first {SEARCH_CHOICES:,}. Add words or filters to narrow the search.")
+                matches = matches[:SEARCH_CHOICES]
+            matches = [(snap.row_numbers[p], snap.values[p + 1]) for p in matches]
             labels = [
                 f"Row {idx}: {row[0]} | {row[1]} | {row[2]} sticks | ₹{float(row[5]):.2f} | {row[9] or 'No vendor'}"
                 if len(row) > 9 else f"Row {idx}: {' | '.join(str(cell) for cell in row[:6])}"
@@ -206,6 +2334,12 @@ def view_edit_delete_tab(ws, df):
             ]
             selected = st.selectbox("Select entry", options=list(range(len(matches))), format_func=lambda i: labels[i])
             sel_idx_1based, sel_row = matches[selected]
+            sel_id = row_id_of(sel_row)
+            sel_key = sel_id or sel_idx_1based
+            # Version the entry had when its form widgets were (re)created; edits are checked against it
+            base_key = f"edit_base_{sel_key}"
+            if f"edit_date_{sel_key}" not in st.session_state or base_key not in st.session_state:
+                st.session_state[base_key] = row_version(sel_row)
             
             st.write("**Selected entry values:**")
             st.json({DEFAULT_COLUMNS[i]: sel_row[i] if i < len(sel_row) else "" for i in range(len(DEFAULT_COLUMNS))})
@@ -213,54 +2347,115 @@ def view_edit_delete_tab(ws, df):
             col_edit, col_delete = st.columns(2)
             
             with col_edit:
-                with st.expander("✏️ Edit Entry", expanded=True):
-                    try:
-                        date_value = pd.to_datetime(sel_row[0]).date() if sel_row[0] else date.today()
-                    except:
-                        date_value = date.today()
-                    
-                    e_date = st.date_input("Date", value=date_value, key=f"edit_date_{sel_idx_1based}")
-                    e_brand = st.text_input("Brand", sel_row[1] if len(sel_row) > 1 else "", key=f"edit_brand_{sel_idx_1based}")
-                    e_qty = st.number_input("Quantity (sticks)", min_value=1, value=int(float(sel_row[2] or 1)), step=1, key=f"edit_qty_{sel_idx_1based}")
-                    e_units = st.number_input("Units per pack", min_value=1, value=int(float(sel_row[3] or 20)), step=1, key=f"edit_units_{sel_idx_1based}")
-                    e_price = st.number_input("Price per pack (₹)", min_value=0.0, value=float(sel_row[4] or 0.0), step=0.5, format="%.2f", key=f"edit_price_{sel_idx_1based}")
-                    e_payment = st.selectbox("Payment Method", ["Cash", "Credit"], index=0 if sel_row[6] == "Cash" else 1, key=f"edit_payment_{sel_idx_1based}")
-                    e_paid = st.number_input("Amount paid (₹)", min_value=0.0, value=float(sel_row[7] or 0.0), step=0.5, format="%.2f", key=f"edit_paid_{sel_idx_1based}")
-                    e_vendor = st.text_input("Vendor (optional)", sel_row[9] if len(sel_row) > 9 else "", key=f"edit_vendor_{sel_idx_1based}")
-                    e_notes = st.text_area("Notes (optional)", sel_row[10] if len(sel_row) > 10 else "", key=f"edit_notes_{sel_idx_1based}")
-                    
-                    if e_units > 0:
-                        e_packs = e_qty / e_units
-                        e_total = e_packs * e_price
-                        e_outstanding = max(e_total - e_paid, 0.0)
-                        
-                        st.markdown("### 💰 Edited Calculation Breakdown")
-                        col_ecalc1, col_ecalc2 = st.columns(2)
-                        with col_ecalc1:
-                            st.info(f"Packs: {e_qty} ÷ {e_units} = {e_packs:.3f} packs\n\n"
-                                    f"Total Cost: {e_packs:.3f} × ₹{e_price:.2f} = ₹{e_total:.2f}")
-                        with col_ecalc2:
-                            st.success(f"Outstanding: ₹{e_total:.2f} - ₹{e_paid:.2f} = ₹{e_outstanding:.2f}\n\n"
-                                       f"Cost per stick: ₹{e_total/e_qty:.2f}")
-                        
-                        if st.button("💾 Update Entry", key=f"update_{sel_idx_1based}", type="primary"):
-                            if e_brand.strip():
-                                row = [
-                                    str(e_date), e_brand.strip(), int(e_qty), int(e_units),
-                                    float(e_price), float(e_total), e_payment,
-                                    float(e_paid), float(e_outstanding), e_vendor.strip(), e_notes.strip()
-                                ]
-                                update_data(ws, sel_idx_1based, row)
-                            else:
-                                st.error("Brand name is required.")
+                edit_entry_form(ws, sel_idx_1based, sel_row, sel_id, sel_key, base_key)
             
             with col_delete:
                 st.markdown("### 🗑️ Delete Entry")
-                if st.button("🗑️ Delete Selected Entry", key=f"delete_{sel_idx_1based}", type="secondary"):
-                    delete_data(ws, sel_idx_1based)
+                if st.button("🗑️ Delete Selected Entry", key=f"delete_{sel_key}", type="secondary"):
+                    delete_data(ws, sel_idx_1based, sel_id, st.session_state.pop(base_key, None))
+
+def import_tab(ws):
+    """Render the 'Import' view: bulk-append entries from a CSV or Excel file."""
+    st.subheader("📥 Import Entries")
+    st.caption("Columns are matched by name (Date, Brand, Quantity, UnitsPerPack, PricePerPack, PaymentMethod, "
+               "AmountPaid, Vendor, Notes). Dates other than YYYY-MM-DD are read day first. Totals and outstanding "
+               "amounts are recalculated like on the form.")
+    upload = st.file_uploader("CSV or Excel file", type=["csv", "xlsx"])
+    skip_existing = st.checkbox(
+        "Skip entries already in the sheet", value=True,
+        help="Also makes a failed import safe to run again: it continues where it stopped.",
+    )
+    if upload is None or not st.button("📥 Import entries", type="primary"):
+        return
+    bar = st.progress(0.0)
+    status_line = st.empty()
+    status = {"read": 0, "written": 0, "skipped": 0, "invalid": 0, "errors": []}
+    try:
+        for status in import_entries(ws, read_import_chunks(upload, upload.name), skip_existing):
+            bar.progress(status["progress"])
+            status_line.caption(f"Read {status['read']:,} · written {status['written']:,} · "
+                                f"already present {status['skipped']:,} · invalid {status['invalid']:,}")
+    except ImportFileError as e:
+        st.error(str(e))
+        return
+    except Exception as e:
+        _invalidate_on_auth_error(ws, e)
+        st.error(f"Import stopped after writing {status['written']:,} entries. Run it again to continue; "
+                 f"entries already written will be skipped. Details: {e}")
+    else:
+        st.success(f"Imported {status['written']:,} entries.")
+    if status["errors"]:
+        st.warning(f"{status['invalid']:,} rows were not imported:")
+        st.dataframe(pd.DataFrame(status["errors"], columns=["Line", "Problem"]), hide_index=True, use_container_width=True)
 
-def analytics_tab(df):
-    """Render the 'Analytics' tab."""
+def export_tab(ws, df):
+    """Render the 'Export' view: download the entries, optionally filtered."""
+    st.subheader("📤 Export Entries")
+    if df.empty:
+        st.info("No data to export yet.")
+        return
+    col_from, col_to = st.columns(2)
+    start = col_from.date_input("From", value=None, key="export_from")
+    end = col_to.date_input("To", value=None, key="export_to")
+    col_brand, col_vendor = st.columns(2)
+    brands = col_brand.multiselect("Brands", sorted(b for b in df["Brand"].unique() if b), key="export_brands")
+    vendors = col_vendor.multiselect("Vendors", sorted(v for v in df["Vendor"].unique() if v), key="export_vendors")
+    fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key="export_format")
+
+    snap = get_snapshot(ws)
+    positions = cached_for_version(ws, snap, ("export", start, end, tuple(brands), tuple(vendors)),
+                                   lambda: np.flatnonzero(export_mask(snap.df, start, end, brands, vendors)))
+    st.caption(f"{len(positions):,} of {len(snap.df):,} entries selected")
+    extension, mime = EXPORT_FORMATS[fmt]
+
+    def data():
+        # Runs only when the button is clicked, outside the script run
+        return export_file(snap.df, positions, fmt)
+
+    if fmt == "Parquet" and not _has_pyarrow():
+        st.warning("Parquet export needs the pyarrow package.")
+    elif fmt == "Excel" and len(positions) > EXCEL_MAX_ROWS:
+        st.warning(f"Excel sheets hold at most {EXCEL_MAX_ROWS:,} rows; narrow the filters or use CSV/Parquet.")
+    else:
+        st.download_button(f"⬇️ Download {fmt}", data=data, file_name=f"entries.{extension}", mime=mime,
+                           type="primary", on_click="ignore", disabled=not len(positions))
+
+def build_analytics_figures(analytics) -> dict:
+    """Plotly figures (and the outstanding total) for the Analytics tab."""
+    figures = {"total_outstanding": analytics["total_outstanding"]}
+    figures["spending"] = px.line(
+        analytics["spending"],
+        x="Date",
+        y="TotalCost",
+        title="Monthly Spending Trend",
+        labels={"TotalCost": "Total Cost (₹)", "Date": "Month"},
+        markers=True
+    )
+    figures["brand"] = px.bar(
+        analytics["brand_freq"],
+        x="Brand",
+        y="Quantity",
+        title="Total Sticks Smoked by Brand",
+        labels={"Quantity": "Total Sticks"},
+        color="Brand"
+    )
+    figures["payment"] = px.pie(
+        analytics["payment_counts"],
+        names="PaymentMethod",
+        values="Count",
+        title="Transactions by Payment Method"
+    )
+    return figures
+
+def get_analytics_figures(ws, snap):
+    """The Analytics tab's figures for this data version, or None when no entry is usable."""
+    def build():
+        analytics = get_rollups(ws, snap).analytics()
+        return None if analytics is None else build_analytics_figures(analytics)
+    return cached_for_version(ws, snap, ("figures",), build)
+
+def analytics_tab(ws, df):
+    """Render the 'Analytics' tab from cached figures of the snapshot's rollups."""
     st.subheader("📈 Analytics")
     
     if df.empty:
@@ -274,64 +2469,103 @@ def analytics_tab(df):
             st.warning(f"Missing column: {col}. Cannot generate analytics.")
             return
 
-    # Filter out invalid data
-    df = df.dropna(subset=required_cols).copy()
-    if df.empty:
+    figures = get_analytics_figures(ws, get_snapshot(ws))
+    if figures is None:
         st.info("No valid data available for analytics after filtering.")
         return
     
     # Spending over time
     st.markdown("### Total Spending Over Time")
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-    df = df.dropna(subset=["Date"])
-    spending = df.groupby(df["Date"].dt.to_period("M"))["TotalCost"].sum().reset_index()
-    spending["Date"] = spending["Date"].dt.to_timestamp()
+    st.plotly_chart(figures["spending"], use_container_width=True)
     
-    fig_spending = px.line(
-        spending,
-        x="Date",
-        y="TotalCost",
-        title="Monthly Spending Trend",
-        labels={"TotalCost": "Total Cost (₹)", "Date": "Month"},
-        markers=True
-    )
-    st.plotly_chart(fig_spending, use_container_width=True)
-    
-    # Smoking frequency by brand (if Brand exists)
-    if "Brand" in df.columns:
-        st.markdown("### Smoking Frequency by Brand")
-        brand_freq = df.groupby("Brand")["Quantity"].sum().reset_index()
-        fig_brand = px.bar(
-            brand_freq,
-            x="Brand",
-            y="Quantity",
-            title="Total Sticks Smoked by Brand",
-            labels={"Quantity": "Total Sticks"},
-            color="Brand"
-        )
-        st.plotly_chart(fig_brand, use_container_width=True)
+    # Smoking frequency by brand
+    st.markdown("### Smoking Frequency by Brand")
+    st.plotly_chart(figures["brand"], use_container_width=True)
     
-    # Outstanding balance (if Outstanding exists)
-    if "Outstanding" in df.columns:
-        st.markdown("### Outstanding Balance")
-        total_outstanding = df["Outstanding"].sum()
-        st.metric("Total Outstanding", f"₹{total_outstanding:.2f}")
+    # Outstanding balance
+    st.markdown("### Outstanding Balance")
+    st.metric("Total Outstanding", f"₹{figures['total_outstanding']:.2f}")
     
-    # Payment method breakdown (if PaymentMethod exists)
-    if "PaymentMethod" in df.columns:
-        st.markdown("### Payment Method Breakdown")
-        payment_counts = df["PaymentMethod"].value_counts().reset_index()
-        payment_counts.columns = ["PaymentMethod", "Count"]
-        fig_payment = px.pie(
-            payment_counts,
-            names="PaymentMethod",
-            values="Count",
-            title="Transactions by Payment Method"
-        )
-        st.plotly_chart(fig_payment, use_container_width=True)
+    # Payment method breakdown
+    st.markdown("### Payment Method Breakdown")
+    st.plotly_chart(figures["payment"], use_container_width=True)
+
+def credit_tab(ws, df):
+    """Render the 'Credit Ledger' view from the snapshot's per-vendor ledgers."""
+    st.subheader("🧾 Credit Ledger")
+    if df.empty:
+        st.info("No entries yet.")
+        return
+    ledger = get_ledger(ws, get_snapshot(ws))
+    summary = ledger.summary()
+    if summary.empty:
+        st.info("Every entry is fully paid.")
+        return
+
+    cols = st.columns(len(AGING_BUCKETS) + 1)
+    cols[0].metric("Total owed", f"₹{summary['Balance'].clip(lower=0).sum():.2f}")
+    for col, bucket in zip(cols[1:], AGING_BUCKETS):
+        col.metric(bucket, f"₹{summary[bucket].sum():.2f}")
+
+    vendors = summary["Vendor"].tolist()
+    summary["Vendor"] = summary["Vendor"].replace("", "(no vendor)")
+    st.dataframe(summary, hide_index=True, use_container_width=True, column_config={
+        **{col: st.column_config.NumberColumn(format="₹%.2f") for col in ["Balance", *AGING_BUCKETS]},
+        "OldestOpen": st.column_config.DateColumn("Oldest unpaid", format="YYYY-MM-DD"),
+    })
+    st.caption("Payments beyond an entry's total settle the vendor's oldest unpaid entries first.")
+
+    vendor = st.selectbox("Balance over time", vendors, key="ledger_vendor",
+                          format_func=lambda v: v or "(no vendor)")
+    history = ledger.history(vendor)
+    fig = px.line(history, x="Date", y="Balance", line_shape="hv", markers=len(history) < 200,
+                  labels={"Balance": "Balance (₹)"})
+    st.plotly_chart(fig, use_container_width=True)
+
+def sync_status_sidebar(ws):
+    """Show pending writes, sync state and API call counters in the sidebar."""
+    stats = get_governor().stats
+    with st.sidebar:
+        st.caption(f"Sheets API calls: {stats['calls']} · throttled: {stats['throttled']} · "
+                   f"retried: {stats['retried']} · coalesced: {stats['coalesced']} · failed: {stats['failed']}")
+    queue = get_write_queue(ws)
+    if queue is not None:
+        pending = queue.pending_count()
+        with st.sidebar:
+            st.divider()
+            st.caption(f"⏳ {pending} entr{'y' if pending == 1 else 'ies'} waiting to be written to the sheet"
+                       if pending else "✅ All entries written to the sheet")
+            if queue.last_error is not None:
+                st.warning(f"Writing queued entries failed; they will be retried. Details: {queue.last_error}")
+            if pending and st.button("⏫ Write now"):
+                try:
+                    queue.flush()
+                except Exception as e:
+                    st.error(f"Failed to write queued entries. Details: {e}")
+                st.rerun()
+    status = mirror_status(ws)
+    if status is None:
+        return
+    with st.sidebar:
+        st.divider()
+        st.subheader("Local Mirror")
+        last_pull = time.strftime("%H:%M:%S", time.localtime(status["last_pull"])) if status["last_pull"] else "never"
+        st.caption(f"Pending writes: {status['pending']} · Last pull: {last_pull}")
+        if status["error"] is not None:
+            st.warning(f"Sheet sync is failing; serving local data. Details: {status['error']}")
+        if status["conflicts"]:
+            st.warning(f"{len(status['conflicts'])} local change(s) were not applied because the entries "
+                       "were changed on the sheet first.")
+            with st.expander("Show conflicts"):
+                for row_id, current, mine in status["conflicts"]:
+                    st.caption(f"Entry {row_id}: " + ("deleted here" if mine is None else "edited here"))
+                    if mine is not None:
+                        st.dataframe(pd.DataFrame(row_diff(current, mine)), hide_index=True)
 
 
 # ---------- Main Application ----------
+VIEWS = ["➕ Add Entry", "📄 View / Edit / Delete", "📈 Analytics", "🧾 Credit Ledger", "📥 Import", "📤 Export"]
+
 def main():
     st.title("🚬 Smoking Habit & Credit Spend Tracker")
     
@@ -344,7 +2578,7 @@ def main():
         )
         st.caption("Ensure the sheet is shared with your service account email (Editor access).")
         if st.button("🔄 Refresh Data"):
-            st.cache_data.clear()  # corrected
+            invalidate_snapshot()
             st.rerun()
     
     if not sheet_url_or_title:
@@ -356,18 +2590,23 @@ def main():
         st.stop()
     
     ensure_headers(ws)
-    df = load_data(sheet_url_or_title)
+    sync_status_sidebar(ws)
     
-    tab_add, tab_view, tab_analytics = st.tabs(["➕ Add Entry", "📄 View / Edit / Delete", "📈 Analytics"])
+    # Only the selected view runs, so typing in one form does not redo the others' work
+    view = st.radio("View", VIEWS, horizontal=True, key="view", label_visibility="collapsed")
     
-    with tab_add:
+    if view == VIEWS[0]:
         add_entry_tab(ws)
-    
-    with tab_view:
-        view_edit_delete_tab(ws, df)
-    
-    with tab_analytics:
-        analytics_tab(df)
+    elif view == VIEWS[1]:
+        view_edit_delete_tab(ws, load_data(sheet_url_or_title))
+    elif view == VIEWS[2]:
+        analytics_tab(ws, load_data(sheet_url_or_title))
+    elif view == VIEWS[3]:
+        credit_tab(ws, load_data(sheet_url_or_title))
+    elif view == VIEWS[4]:
+        import_tab(ws)
+    else:
+        export_tab(ws, load_data(sheet_url_or_title))
 
 
 if __name__ == "__main__":
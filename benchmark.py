@@ -0,0 +1,131 @@
+"""Time each stage of the tracker's data pipeline on synthetic ledgers: python benchmark.py --sizes 10000 100000."""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+# Keep benchmark runs free of background writer threads and local queue files.
+os.environ.setdefault("TRACKER_WRITE_QUEUE_DIR", "")
+
+import pandas as pd  # noqa: E402
+
+import app  # noqa: E402
+from fake_sheets import FakeWorksheet  # noqa: E402
+
+BRANDS = ["Marlboro", "Classic", "Gold Flake", "Navy Cut", "Wills", "Four Square", "Benson & Hedges", "Camel"]
+BRAND_PRICES = {"Marlboro": 360, "Classic": 340, "Gold Flake": 300, "Navy Cut": 220,
+                "Wills": 200, "Four Square": 180, "Benson & Hedges": 420, "Camel": 380}
+VENDORS = ["Raju Stores", "Anand Pan Shop", "Metro Mart", "Corner Kiosk", "Station Stall", ""]
+NOTES = ["", "", "", "after lunch", "late night", "with friends", "stressful day", "weekend"]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def generate_rows(n: int, seed: int = 42, start: date = date(2019, 1, 1), years: int = 6, credit_share: float = 0.35):
+    """Synthetic entries in DEFAULT_COLUMNS order, priced and settled like the Add Entry form."""
+    rng = random.Random(seed)
+    span = years * 365
+    rows = []
+    for _ in range(n):
+        brand = rng.choice(BRANDS)
+        units = rng.choice([10, 20, 20, 20])
+        price = BRAND_PRICES[brand] * units / 20 + rng.choice([0, 0, 5, 10])
+        quantity = rng.choice([1, 1, 2, 3, 5, 10, units])
+        total = quantity / units * price
+        payment = "Credit" if rng.random() < credit_share else "Cash"
+        paid = total if payment == "Cash" else rng.choice([0.0, 0.0, round(total / 2, 2)])
+        rows.append([
+            str(start + timedelta(days=rng.randrange(span))), brand, quantity, units,
+            float(price), float(total), payment, float(paid), float(max(total - paid, 0.0)),
+            rng.choice(VENDORS), rng.choice(NOTES),
+        ])
+    rows.sort(key=lambda r: r[0])
+    return rows
+
+
+def make_worksheet(n: int, seed: int = 42) -> FakeWorksheet:
+    return FakeWorksheet([app.DEFAULT_COLUMNS] + generate_rows(n, seed), spreadsheet_id=f"bench-{n}")
+
+
+def load_stage(ws):
+    app.invalidate_snapshot(ws)
+    return app.get_snapshot(ws)
+
+
+def stages(ws):
+    """(name, callable) pairs for each pipeline stage; later stages reuse the loaded snapshot."""
+    snap = load_stage(ws)
+    return [
+        ("load_data", lambda: load_stage(ws)),
+        ("search_data", lambda: app.search_data(ws, "raju")),
+        ("table_page", lambda: snap.df.iloc[app.table_positions(ws, snap, "vendor:raju", "TotalCost", True)[:50]]),
+        ("analytics", lambda: app.Rollups(snap.df).analytics()),
+        ("analytics_rollups", lambda: app.get_rollups(ws, snap).analytics()),
+        ("credit_ledger", lambda: app.CreditLedger(snap.df).summary()),
+        ("ledger_summary", lambda: app.get_ledger(ws, snap).summary()),
+    ]
+
+
+def measure(fn, repeat: int):
+    """Best wall time over ``repeat`` runs, then peak traced memory of one extra run."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(sizes, repeat: int, seed: int):
+    results = []
+    for n in sizes:
+        ws = make_worksheet(n, seed)
+        for name, fn in stages(ws):
+            seconds, peak = measure(fn, repeat)
+            results.append({"stage": name, "rows": n, "seconds": round(seconds, 6),
+                            "peak_mb": round(peak / 2**20, 2)})
+            print(f"{name:<18} {n:>9,} rows  {seconds * 1000:10.1f} ms  {peak / 2**20:9.1f} MB peak", flush=True)
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="row counts to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is reported)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the synthetic ledger")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeat, args.seed)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""Local stand-in for the Google Sheets worksheet API, with optional persistence and fault injection."""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Protocol
+
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+
+
+class WorksheetBackend(Protocol):
+    """The worksheet methods the tracker relies on, met by gspread, FakeWorksheet and GovernedWorksheet."""
+    spreadsheet_id: str
+    id: int
+
+    def get_all_values(self, *args, **kwargs) -> list: ...
+    def get(self, range_name=None, *args, **kwargs) -> list: ...
+    def batch_get(self, ranges, *args, **kwargs) -> list: ...
+    def row_values(self, row: int, *args, **kwargs) -> list: ...
+    def col_values(self, col: int, *args, **kwargs) -> list: ...
+    def insert_row(self, values, index: int = 1, *args, **kwargs) -> dict: ...
+    def append_row(self, values, *args, **kwargs) -> dict: ...
+    def append_rows(self, values, *args, **kwargs) -> dict: ...
+    def batch_update(self, data, *args, **kwargs) -> dict: ...
+    def update(self, values, range_name=None, *args, **kwargs) -> dict: ...
+    def delete_rows(self, start_index, end_index=None) -> dict: ...
+
+
+class FakeResponse:
+    """Just enough of ``requests.Response`` to build a gspread ``APIError``."""
+
+    def __init__(self, code: int, message: str, retry_after=None):
+        self.status_code = code
+        self.text = message
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+        self._error = {"code": code, "message": message, "status": "FAKE"}
+
+    def json(self):
+        return {"error": self._error}
+
+
+def _render(value) -> str:
+    """Render a written value as a formatted cell, like FORMATTED_VALUE reads do."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else f"{value:.10g}"
+    return str(value)
+
+
+def _bounds(range_name: str):
+    """0-based, end-exclusive (row_start, row_end, col_start, col_end); ends may be None."""
+    grid = a1_range_to_grid_range(range_name.split("!")[-1])
+    return (grid.get("startRowIndex", 0), grid.get("endRowIndex"),
+            grid.get("startColumnIndex", 0), grid.get("endColumnIndex"))
+
+
+class FakeSpreadsheet:
+    """The parent spreadsheet of a FakeWorksheet, for Drive-metadata style revision checks."""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.id = worksheet.spreadsheet_id
+
+    def get_lastUpdateTime(self) -> str:
+        self.worksheet._api_call("get_lastUpdateTime")
+        return f"revision-{self.worksheet.revision}"
+
+
+class FakeWorksheet:
+    """In-memory worksheet with optional JSON persistence, latency, quota and error injection."""
+
+    def __init__(self, rows=None, path=None, latency: float = 0.0, jitter: float = 0.0,
+                 quota_per_minute: int = None, error_rate: float = 0.0, title: str = "Sheet1",
+                 spreadsheet_id: str = "fake", sheet_id: int = 0, clock=time.monotonic, sleep=time.sleep):
+        self.spreadsheet_id = spreadsheet_id
+        self.id = sheet_id
+        self.title = title
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.RLock()
+        self.calls = deque()
+        self.call_counts = {}
+        self.revision = 0
+        self.spreadsheet = FakeSpreadsheet(self)
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                rows = json.load(f)
+        self.rows = [[_render(v) for v in row] for row in (rows or [])]
+
+    # ----- fault injection -----
+    def _api_call(self, name: str):
+        with self.lock:
+            self.call_counts[name] = self.call_counts.get(name, 0) + 1
+            now = self.clock()
+            if self.quota_per_minute is not None:
+                while self.calls and now - self.calls[0] >= 60:
+                    self.calls.popleft()
+                if len(self.calls) >= self.quota_per_minute:
+                    retry_after = int(60 - (now - self.calls[0])) + 1
+                    raise APIError(FakeResponse(429, "Quota exceeded (fake)", retry_after))
+                self.calls.append(now)
+        if self.latency or self.jitter:
+            self.sleep(self.latency + random.random() * self.jitter)
+        if self.error_rate and random.random() < self.error_rate:
+            raise APIError(FakeResponse(503, "Backend unavailable (fake)"))
+
+    def _save(self):
+        self.revision += 1
+        if self.path:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.rows, f)
+            os.replace(tmp, self.path)
+
+    # ----- reads -----
+    def _trimmed(self) -> list:
+        rows = [list(r) for r in self.rows]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def _read(self, range_name: str) -> list:
+        r0, r1, c0, c1 = _bounds(range_name)
+        out = []
+        for row in self.rows[r0:r1]:
+            cells = row[c0:c1]
+            while cells and cells[-1] == "":
+                cells.pop()
+            out.append(cells)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def get_all_values(self, *args, **kwargs) -> list:
+        self._api_call("get_all_values")
+        with self.lock:
+            rows = self._trimmed()
+            width = max((len(r) for r in rows), default=0)
+            return [r + [""] * (width - len(r)) for r in rows]
+
+    def get(self, range_name=None, *args, **kwargs) -> list:
+        self._api_call("get")
+        with self.lock:
+            return self._read(range_name) if range_name else self._trimmed()
+
+    def batch_get(self, ranges, *args, **kwargs) -> list:
+        self._api_call("batch_get")
+        with self.lock:
+            return [self._read(r) for r in ranges]
+
+    def row_values(self, row: int, *args, **kwargs) -> list:
+        self._api_call("row_values")
+        with self.lock:
+            rows = self._read(f"A{row}:ZZ{row}")
+            return rows[0] if rows else []
+
+    def col_values(self, col: int, *args, **kwargs) -> list:
+        self._api_call("col_values")
+        with self.lock:
+            values = [r[col - 1] if col <= len(r) else "" for r in self._trimmed()]
+            while values and values[-1] == "":
+                values.pop()
+            return values
+
+    # ----- writes -----
+    def _write(self, r0: int, c0: int, values):
+        for i, row in enumerate(values):
+            while len(self.rows) <= r0 + i:
+                self.rows.append([])
+            target = self.rows[r0 + i]
+            needed = c0 + len(row)
+            if len(target) < needed:
+                target.extend([""] * (needed - len(target)))
+            target[c0:needed] = [_render(v) for v in row]
+
+    def append_rows(self, values, *args, **kwargs) -> dict:
+        self._api_call("append_rows")
+        with self.lock:
+            start = len(self._trimmed())
+            self.rows = self._trimmed()
+            self._write(start, 0, values)
+            self._save()
+            width = max((len(v) for v in values), default=1)
+            updated = f"{self.title}!A{start + 1}:{rowcol_to_a1(start + len(values), width)}"
+            return {"spreadsheetId": self.spreadsheet_id, "updates": {"updatedRange": updated, "updatedRows": len(values)}}
+
+    def append_row(self, values, *args, **kwargs) -> dict:
+        return self.append_rows([values], *args, **kwargs)
+
+    def update(self, values, range_name=None, *args, **kwargs) -> dict:
+        self._api_call("update")
+        with self.lock:
+            r0, _, c0, _ = _bounds(range_name or "A1")
+            self._write(r0, c0, values)
+            self._save()
+            return {"updatedRange": range_name}
+
+    def batch_update(self, data, *args, **kwargs) -> dict:
+        self._api_call("batch_update")
+        with self.lock:
+            for item in data:
+                r0, _, c0, _ = _bounds(item["range"])
+                self._write(r0, c0, item["values"])
+            self._save()
+            return {"totalUpdatedRanges": len(data)}
+
+    def insert_row(self, values, index: int = 1, *args, **kwargs) -> dict:
+        self._api_call("insert_row")
+        with self.lock:
+            self.rows.insert(index - 1, [_render(v) for v in values])
+            self._save()
+            return {}
+
+    def delete_rows(self, start_index: int, end_index: int = None) -> dict:
+        self._api_call("delete_rows")
+        with self.lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
+            self._save()
+            return {}
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def open_fake_worksheet(name: str, directory: str = None, **options) -> FakeWorksheet:
+    """Return the process-wide fake worksheet ``name``, persisted under ``directory`` if given."""
+    with _registry_lock:
+        ws = _registry.get(name)
+        if ws is None:
+            path = None
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"{name}.json")
+            ws = _registry[name] = FakeWorksheet(path=path, spreadsheet_id=f"fake-{name}", **options)
+        return ws
@@ -0,0 +1,36 @@
+"""Shared setup for the tracker tests: environment, synthetic rows and fake worksheets."""
+import itertools
+import os
+
+# No write-behind queue files or background change probes while testing
+os.environ.setdefault("TRACKER_WRITE_QUEUE_DIR", "")
+os.environ.setdefault("TRACKER_CHANGE_PROBE_SECONDS", "0")
+# The fake backend has no quota, so the shared governor need not pace calls to it
+for _quota in ("READ", "WRITE", "PROJECT"):
+    os.environ.setdefault(f"TRACKER_{_quota}_QUOTA_PER_MINUTE", "1000000")
+
+import app  # noqa: E402
+from benchmark import generate_rows  # noqa: E402
+from fake_sheets import FakeWorksheet  # noqa: E402
+
+_sheet_ids = itertools.count()
+
+
+def text_rows(n: int, seed: int = 7):
+    """Synthetic entries as the sheet returns them: every cell formatted as text."""
+    return [[app._cell_text(c) for c in row] for row in generate_rows(n, seed=seed)]
+
+
+def make_worksheet(rows, ids: bool = True) -> FakeWorksheet:
+    """A fake worksheet with its own spreadsheet id holding ``rows``, with an ID column unless ``ids`` is False."""
+    if ids:
+        grid = [app.SHEET_COLUMNS] + [list(row) + [app.new_row_id()] for row in rows]
+    else:
+        grid = [app.DEFAULT_COLUMNS] + [list(row) for row in rows]
+    return FakeWorksheet(grid, spreadsheet_id=f"test-{next(_sheet_ids)}")
+
+
+def scan(rows, keyword: str, width: int = len(app.DEFAULT_COLUMNS)):
+    """Positions of rows with a cell containing ``keyword``, the way search worked before the index."""
+    needle = keyword.lower()
+    return [p for p, row in enumerate(rows) if any(needle in str(cell).lower() for cell in row[:width])]
@@ -0,0 +1,86 @@
+import importlib.util
+import io
+import unittest
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from helpers import app, text_rows
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+HAS_OPENPYXL = importlib.util.find_spec("openpyxl") is not None
+
+
+def read_back(fmt, data):
+    if fmt == "CSV":
+        df = pd.read_csv(io.BytesIO(data), dtype={"Notes": str, "Vendor": str}, keep_default_na=False)
+        return df.assign(Date=pd.to_datetime(df["Date"]))
+    if fmt == "Parquet":
+        return pd.read_parquet(io.BytesIO(data))
+    return pd.read_excel(io.BytesIO(data), dtype={"Notes": str, "Vendor": str}, keep_default_na=False)
+
+
+class ExportTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = app.parse_values([app.DEFAULT_COLUMNS] + text_rows(500, seed=12))
+
+    def export(self, fmt, positions, chunk_rows=7):
+        out = io.BytesIO()
+        app.write_export(self.df, positions, fmt, out, chunk_rows=chunk_rows)
+        return read_back(fmt, out.getvalue())
+
+    def assertRoundTrip(self, fmt, positions):
+        exported = self.export(fmt, positions)
+        self.assertEqual(list(exported.columns), app.DEFAULT_COLUMNS)
+        expected = self.df.iloc[positions].reset_index(drop=True)
+        self.assertEqual(len(exported), len(expected))
+        if not len(expected):
+            return
+        np.testing.assert_array_equal(exported["Date"].to_numpy(dtype="datetime64[ns]"), expected["Date"].to_numpy(dtype="datetime64[ns]"))
+        for col in ["Brand", "PaymentMethod", "Vendor", "Notes"]:
+            self.assertEqual(exported[col].fillna("").astype(str).tolist(), expected[col].astype(object).fillna("").astype(str).tolist(), col)
+        for col in app.NUMERIC_COLUMNS:
+            np.testing.assert_allclose(exported[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float), err_msg=col)
+
+    def selection(self):
+        brands = self.df["Brand"].astype(object).value_counts().index[:2].tolist()
+        mask = app.export_mask(self.df, date(2020, 1, 1), date(2023, 12, 31), brands=brands)
+        self.assertTrue(0 < mask.sum() < len(self.df))
+        return np.flatnonzero(mask)
+
+    def test_export_mask(self):
+        mask = app.export_mask(self.df, date(2021, 1, 1), date(2021, 6, 30), vendors=["Metro Mart"])
+        dates = self.df["Date"]
+        expected = (dates >= "2021-01-01") & (dates < "2021-07-01") & (self.df["Vendor"] == "Metro Mart")
+        self.assertTrue(expected.any())
+        np.testing.assert_array_equal(mask, expected.to_numpy())
+        self.assertTrue(app.export_mask(self.df).all())
+
+    def test_csv(self):
+        self.assertRoundTrip("CSV", self.selection())
+        self.assertRoundTrip("CSV", np.arange(len(self.df)))
+
+    @unittest.skipUnless(HAS_PYARROW, "needs pyarrow")
+    def test_parquet(self):
+        self.assertRoundTrip("Parquet", self.selection())
+        self.assertRoundTrip("Parquet", np.arange(len(self.df)))
+
+    @unittest.skipUnless(HAS_OPENPYXL, "needs openpyxl")
+    def test_excel(self):
+        self.assertRoundTrip("Excel", self.selection())
+
+    def test_empty_selection_has_only_the_header(self):
+        formats = ["CSV"] + ["Parquet"] * HAS_PYARROW + ["Excel"] * HAS_OPENPYXL
+        for fmt in formats:
+            with self.subTest(fmt=fmt):
+                self.assertRoundTrip(fmt, np.array([], dtype=int))
+
+    def test_unknown_format(self):
+        with self.assertRaises(app.ExportError):
+            app.write_export(self.df, np.arange(3), "JSON", io.BytesIO())
+
+
+if __name__ == "__main__":
+    unittest.main()
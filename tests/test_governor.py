@@ -0,0 +1,214 @@
+import threading
+import time
+import unittest
+
+from gspread.exceptions import APIError
+
+from fake_sheets import FakeResponse
+from helpers import app, make_worksheet
+
+
+class StubResponse:
+    """Just enough of ``requests.Response`` to build a gspread ``APIError``."""
+
+    def __init__(self, code: int, retry_after=None):
+        self.status_code = code
+        self.text = "stub failure"
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self.text, "status": "STUB"}}
+
+
+def failing(codes, result="ok"):
+    """A callable raising APIError with each of ``codes`` in turn, then returning ``result``."""
+    codes, calls = list(codes), []
+
+    def fn():
+        calls.append(1)
+        if codes:
+            code = codes.pop(0)
+            raise APIError(StubResponse(*code) if isinstance(code, tuple) else StubResponse(code))
+        return result
+    fn.calls = calls
+    return fn
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_steady_rate(self):
+        clock = FakeClock()
+        bucket = app.TokenBucket(60, capacity=3, clock=clock)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+        self.assertAlmostEqual(bucket.reserve(), 2.0)  # reservations queue up behind each other
+
+    def test_refills_up_to_capacity(self):
+        clock = FakeClock()
+        bucket = app.TokenBucket(60, capacity=3, clock=clock)
+        for _ in range(3):
+            bucket.reserve()
+        clock.now += 100
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertGreater(bucket.reserve(), 0.0)
+
+
+class GovernorThrottleTest(unittest.TestCase):
+    def test_calls_are_paced_to_the_quota(self):
+        clock = FakeClock()
+        governor = app.SheetsGovernor(read_per_minute=60, project_per_minute=600, clock=clock, sleep=clock.sleep)
+        for _ in range(30):
+            governor.call("read", lambda: None)
+        # 10 calls of burst, then one per second
+        self.assertAlmostEqual(clock.now, 20.0)
+        self.assertEqual(governor.stats["throttled"], 20)
+
+    def test_project_bucket_is_shared_by_reads_and_writes(self):
+        clock = FakeClock()
+        governor = app.SheetsGovernor(read_per_minute=600, write_per_minute=600, project_per_minute=60,
+                                      clock=clock, sleep=clock.sleep)
+        for i in range(20):
+            governor.call("read" if i % 2 else "write", lambda: None)
+        self.assertAlmostEqual(clock.now, 10.0)
+
+
+class CoalescingTest(unittest.TestCase):
+    def setUp(self):
+        self.governor = app.SheetsGovernor(sleep=lambda seconds: None)
+        self.release = threading.Event()
+        self.calls = []
+
+    def slow_read(self):
+        self.calls.append(1)
+        self.release.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    def read_concurrently(self, n, key=("sheet", "all")):
+        results = [None] * n
+
+        def reader(i):
+            try:
+                results[i] = self.governor.call("read", self.slow_read, coalesce_key=key)
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        while self.governor.stats["coalesced"] < n - 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_identical_reads_share_one_call(self):
+        self.result = [["Date"]]
+        results = self.read_concurrently(5)
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_failure_reaches_every_waiter(self):
+        self.result = APIError(StubResponse(400))
+        results = self.read_concurrently(3)
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(all(isinstance(r, APIError) for r in results))
+
+    def test_later_reads_call_again(self):
+        self.result = "first"
+        self.release.set()
+        self.governor.call("read", self.slow_read, coalesce_key="k")
+        self.governor.call("read", self.slow_read, coalesce_key="k")
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.governor.stats["coalesced"], 0)
+
+
+class GovernorRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.governor = app.SheetsGovernor(max_retries=3, sleep=self.sleeps.append, rng=lambda: 0.0)
+
+    def test_retries_server_and_quota_errors(self):
+        fn = failing([503, 429])
+        self.assertEqual(self.governor.call("read", fn), "ok")
+        self.assertEqual(len(fn.calls), 3)
+        self.assertEqual(self.governor.stats["retried"], 2)
+
+    def test_honours_retry_after(self):
+        self.governor.call("read", failing([(429, 7)]))
+        self.assertIn(7.0, self.sleeps)
+
+    def test_gives_up_after_max_retries(self):
+        fn = failing([503] * 10)
+        with self.assertRaises(APIError):
+            self.governor.call("write", fn)
+        self.assertEqual(len(fn.calls), 4)
+        self.assertEqual(self.governor.stats["failed"], 1)
+
+    def test_client_errors_are_not_retried(self):
+        fn = failing([400])
+        with self.assertRaises(APIError):
+            self.governor.call("read", fn)
+        self.assertEqual(len(fn.calls), 1)
+
+
+class NonIdempotentWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.ws = make_worksheet([])
+        self.governor = app.SheetsGovernor(sleep=lambda seconds: None, rng=lambda: 0.0)
+        self.governed = app.GovernedWorksheet(self.ws, self.governor)
+
+    def fail_after_applying(self, name, code, times=1):
+        """Make ``name`` apply the write and then fail with ``code`` for the first ``times`` calls."""
+        method, calls = getattr(self.ws, name), []
+
+        def flaky(*args, **kwargs):
+            result = method(*args, **kwargs)
+            calls.append(1)
+            if len(calls) <= times:
+                raise APIError(FakeResponse(code, "fake failure"))
+            return result
+        setattr(self.ws, name, flaky)
+
+    def test_appends_are_not_retried_on_server_errors(self):
+        self.fail_after_applying("append_rows", 503)
+        with self.assertRaises(APIError):
+            self.governed.append_rows([["2025-01-01", "Camel"]])
+        self.assertEqual(len(self.ws.get_all_values()), 2)  # header + the one append, not a duplicate
+
+    def test_appends_are_retried_on_quota_errors(self):
+        append_rows, calls = self.ws.append_rows, []
+
+        def quota_limited(values, *args, **kwargs):
+            calls.append(1)
+            if len(calls) < 3:
+                raise APIError(FakeResponse(429, "quota"))
+            return append_rows(values, *args, **kwargs)
+        self.ws.append_rows = quota_limited
+        self.governed.append_rows([["2025-01-01", "Camel"]])
+        self.assertEqual(len(self.ws.get_all_values()), 2)
+        self.assertEqual(self.governor.stats["retried"], 2)
+
+    def test_range_writes_are_retried_on_server_errors(self):
+        self.fail_after_applying("batch_update", 503)
+        self.governed.batch_update([{"range": "A2", "values": [["x"]]}])
+        self.assertEqual(self.governor.stats["retried"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import io
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from helpers import app, make_worksheet
+
+CSV = """Date,Brand,Qty,Price per pack,Payment,Amount paid,Vendor
+2025-01-05,Camel,2,"1,360.50",cash,0,Raju Stores
+2025-01-06,,1,380,Cash,380,Raju Stores
+2025-01-07,Gold Flake,0,380,Cheque,380,Night Owl
+
+13/01/2025,Marlboro,1,400,Credit,100,Night Owl
+2025-01-08,Camel,1,380,Card,380,
+"""
+
+
+def chunk(**columns):
+    return pd.DataFrame({name: list(values) for name, values in columns.items()}, dtype=object)
+
+
+class NormalizeChunkTest(unittest.TestCase):
+    def test_valid_row_is_completed_like_the_form(self):
+        rows, errors = app.normalize_chunk(chunk(Date=["2025-01-05"], Brand=["Camel"], Qty=["2"], **{"Price per pack": ["1,360.50"]}))
+        self.assertEqual(errors, [])
+        self.assertEqual(rows, [["2025-01-05", "Camel", 2, 20, 1360.5, 136.05, "Cash", 0.0, 136.05, "", ""]])
+
+    def test_errors_name_the_line_and_every_problem(self):
+        _, errors = app.normalize_chunk(chunk(
+            Date=["2025-01-05", "not a date", "2025-01-07"],
+            Brand=["Camel", "", "Camel"],
+            Quantity=["1", "1.5", "1"],
+            PaymentMethod=["Cash", "Cash", "Cheque"],
+        ), first_line=10)
+        self.assertEqual(errors, [
+            (11, "date is missing or not a date; brand is required; quantity must be a whole number of at least 1"),
+            (12, "payment method must be Cash or Credit"),
+        ])
+
+    def test_dates(self):
+        cells = ["2025-01-05", "2025-01-05 10:30:00", "13/01/2025", "5 Jan 2025", "03/04/2025", "2025-13-01"]
+        rows, errors = app.normalize_chunk(chunk(Date=cells, Brand=["Camel"] * len(cells)))
+        self.assertEqual([row[0] for row in rows], ["2025-01-05", "2025-01-05", "2025-01-13", "2025-01-05"])
+        self.assertEqual(errors, [(6, "date could be day or month first; use YYYY-MM-DD"),
+                                  (7, "date is missing or not a date")])
+
+    def test_date_format_setting(self):
+        with mock.patch.object(app, "IMPORT_DATE_FORMAT", "%m/%d/%Y"):
+            rows, errors = app.normalize_chunk(chunk(Date=["03/04/2025", "2025-03-05", "13/01/2025"], Brand=["Camel"] * 3))
+        self.assertEqual([row[0] for row in rows], ["2025-03-04", "2025-03-05"])
+        self.assertEqual(errors, [(4, "date is missing or not a date")])
+
+
+class ImportEntriesTest(unittest.TestCase):
+    def run_import(self, ws, text, chunk_rows=2):
+        chunks = app.read_import_chunks(io.StringIO(text), "entries.csv", chunk_rows=chunk_rows)
+        *_, status = app.import_entries(ws, chunks, batch_size=2)
+        return status
+
+    def test_line_numbers_across_chunks(self):
+        ws = make_worksheet([])
+        status = self.run_import(ws, CSV)
+        self.assertEqual((status["read"], status["written"], status["invalid"]), (6, 2, 3))
+        self.assertEqual([line for line, _ in status["errors"]], [3, 4, 7])
+        values = ws.get_all_values()
+        self.assertEqual([row[1] for row in values[1:]], ["Camel", "Marlboro"])
+        self.assertEqual(values[1][4], "1360.5")
+        self.assertEqual(values[2][0], "2025-01-13")
+        self.assertTrue(all(row[app.ID_INDEX] for row in values[1:]))
+
+    def test_rerun_skips_imported_entries(self):
+        ws = make_worksheet([])
+        self.run_import(ws, CSV)
+        status = self.run_import(ws, CSV)
+        self.assertEqual((status["written"], status["skipped"]), (0, 2))
+        self.assertEqual(len(ws.get_all_values()), 3)
+
+    def test_repeated_entries_are_matched_one_for_one(self):
+        ws = make_worksheet([])
+        line = "2025-01-05,Camel,1,380,Cash,380,Raju Stores\n"
+        header = CSV.splitlines()[0] + "\n"
+        self.run_import(ws, header + line)
+        status = self.run_import(ws, header + line * 3)
+        self.assertEqual((status["written"], status["skipped"]), (2, 1))
+        self.assertEqual(len(ws.get_all_values()), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import random
+import unittest
+from collections import deque
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from helpers import app, make_worksheet, text_rows
+
+TODAY = date(2025, 1, 10)
+
+
+def frame(n, seed):
+    """Typed entries where some payments exceed the entry's total, settling older debts."""
+    df = app.parse_values([app.DEFAULT_COLUMNS] + text_rows(n, seed=seed))
+    over = np.random.default_rng(seed).random(len(df)) < 0.08
+    df.loc[over, "AmountPaid"] = (df.loc[over, "TotalCost"] * 3).round(2)
+    return df
+
+
+def brute_force(df, today=TODAY):
+    """Replay every vendor's entries in date order, settling the oldest open debts first."""
+    today = pd.Timestamp(today)
+    result = {}
+    ordered = df.assign(Vendor=df["Vendor"].astype(object)).sort_values("Date", kind="stable")
+    for vendor, entries in ordered.groupby("Vendor", sort=False):
+        lots, advance = deque(), 0.0
+        for day, total, paid in zip(entries["Date"], entries["TotalCost"], entries["AmountPaid"]):
+            net = total - paid
+            if abs(net) < 0.005:
+                continue
+            if net > 0:
+                used = min(advance, net)
+                advance -= used
+                if net - used > 0:
+                    lots.append([day, net - used])
+            else:
+                credit = -net
+                while credit > 0 and lots:
+                    used = min(lots[0][1], credit)
+                    lots[0][1] -= used
+                    credit -= used
+                    if lots[0][1] < 1e-9:
+                        lots.popleft()
+                advance += credit
+        buckets = [0.0, 0.0, 0.0]
+        for day, amount in lots:
+            age = (today - day).days
+            buckets[0 if age <= 7 else 1 if age <= 30 else 2] += amount
+        result[vendor] = buckets
+    return result
+
+
+class CreditLedgerTest(unittest.TestCase):
+    def assertSummary(self, ledger, expected):
+        summary = ledger.summary(TODAY).set_index("Vendor")
+        self.assertEqual(sorted(summary.index), sorted(expected))
+        for vendor, buckets in expected.items():
+            np.testing.assert_allclose(summary.loc[vendor, app.AGING_BUCKETS].astype(float), buckets, atol=0.05, err_msg=vendor)
+
+    def test_fifo_settlement_and_aging(self):
+        df = frame(4000, seed=3)
+        self.assertSummary(app.CreditLedger(df), brute_force(df))
+
+    def test_recent_debts_are_bucketed_by_age(self):
+        rows = [
+            ["2025-01-08", "Camel", "20", "20", "380", "380", "Credit", "0", "380", "Kiosk", ""],   # 2 days
+            ["2024-12-20", "Camel", "20", "20", "380", "380", "Credit", "0", "380", "Kiosk", ""],   # 21 days
+            ["2024-11-01", "Camel", "20", "20", "380", "380", "Credit", "0", "380", "Kiosk", ""],   # 70 days
+            ["2025-01-09", "Camel", "20", "20", "380", "380", "Cash", "580", "0", "Kiosk", ""],     # pays 200 extra
+        ]
+        ledger = app.CreditLedger(app.parse_values([app.DEFAULT_COLUMNS] + rows))
+        row = ledger.summary(TODAY).iloc[0]
+        self.assertEqual([row[b] for b in app.AGING_BUCKETS], [380.0, 380.0, 180.0])
+        self.assertEqual(row["Balance"], 940.0)
+        self.assertEqual(row["OldestOpen"], pd.Timestamp("2024-11-01"))
+
+    def test_incremental_matches_rebuild(self):
+        df = frame(3000, seed=5)
+        ledger = app.CreditLedger(df.iloc[:1000])
+        rest = df.iloc[1000:].sample(frac=1, random_state=0)  # out of date order
+        for start in range(0, len(rest), 250):
+            ledger.add(rest.iloc[start:start + 250])
+        removed = df.sample(300, random_state=1)
+        ledger.remove(removed)
+        kept = df.drop(index=removed.index)
+        self.assertSummary(ledger, brute_force(kept))
+        rebuilt = app.CreditLedger(kept).summary(TODAY)
+        np.testing.assert_allclose(ledger.summary(TODAY)["Balance"], rebuilt["Balance"], atol=0.05)
+
+    def test_history_ends_at_balance(self):
+        df = frame(1000, seed=9)
+        ledger = app.CreditLedger(df)
+        summary = ledger.summary(TODAY).set_index("Vendor")
+        for vendor in summary.index:
+            history = ledger.history(vendor)
+            self.assertTrue(history["Date"].is_monotonic_increasing)
+            self.assertAlmostEqual(history["Balance"].iloc[-1], summary.loc[vendor, "Balance"], places=1)
+
+    def test_snapshot_keeps_ledger_current(self):
+        ws = make_worksheet(text_rows(300, seed=4))
+        snap = app.get_snapshot(ws)
+        ledger = app.get_ledger(ws, snap)
+        before = ledger.summary(TODAY).set_index("Vendor")["Balance"].get("Night Owl", 0.0)
+        app.append_entries(ws, [["2025-01-09", "Camel", 20, 20, 380.0, 380.0, "Credit", 100.0, 280.0, "Night Owl", "",
+                                 app.new_row_id()]])
+        self.assertIs(app.get_ledger(ws, app.get_snapshot(ws)), ledger)
+        self.assertAlmostEqual(ledger.summary(TODAY).set_index("Vendor").loc["Night Owl", "Balance"] - before, 280.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from gspread.exceptions import APIError
+
+from fake_sheets import FakeResponse
+from helpers import app, make_worksheet, text_rows
+
+
+def notes(values):
+    return [row[10] for row in values[1:]]
+
+
+class MirrorSyncTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        rows = text_rows(6, seed=8)
+        for i, row in enumerate(rows):
+            row[10] = f"entry {i}"
+        self.ws = make_worksheet(rows)
+        self.ids = [row[app.ID_INDEX] for row in self.ws.get_all_values()[1:]]
+        self.mirror = app.LocalMirror(os.path.join(directory.name, "mirror.sqlite"))
+        self.mirror.replace_values(self.ws.get_all_values(), force=True)
+        self.synchronizer = self.synchronizer_for(self.ws)
+
+    def synchronizer_for(self, ws):
+        # Not started: the tests drive sync_once() themselves
+        return app.MirrorSynchronizer(ws, self.mirror, lambda: None, interval=3600)
+
+    def sync(self, synchronizer=None):
+        synchronizer = synchronizer or self.synchronizer
+        synchronizer.sync_once()
+        if synchronizer.last_error is not None:
+            raise synchronizer.last_error
+        self.assertEqual(self.mirror.pending_count(), 0)
+        self.assertEqual(self.mirror.values(), self.ws.get_all_values())
+
+    def entry(self, i):
+        return self.mirror.values()[i + 1]
+
+    def remote_insert(self, note="theirs"):
+        self.ws.insert_row(["2025-01-01", "Other"] + [""] * 8 + [note, app.new_row_id()], index=2)
+
+    def test_append_races_remote_insert(self):
+        row = text_rows(1, seed=9)[0] + [app.new_row_id()]
+        row[10] = "mine"
+        self.mirror.enqueue("append", None, row)
+        self.remote_insert()
+        self.sync()
+        self.assertEqual(notes(self.ws.get_all_values()), ["theirs"] + [f"entry {i}" for i in range(6)] + ["mine"])
+
+    def test_edit_races_remote_insert(self):
+        base = app.row_version(self.entry(3))
+        edited = self.entry(3)[:app.ID_INDEX]
+        edited[10] = "edited"
+        self.mirror.enqueue("update", None, edited, self.ids[3], base=base)
+        self.remote_insert()
+        self.sync()
+        self.assertEqual(notes(self.ws.get_all_values()), ["theirs", "entry 0", "entry 1", "entry 2", "edited", "entry 4", "entry 5"])
+        self.assertEqual(self.ws.get_all_values()[5][app.ID_INDEX], self.ids[3])
+
+    def test_delete_races_remote_insert(self):
+        base = app.row_version(self.entry(2))
+        self.mirror.enqueue("delete", None, row_id=self.ids[2], base=base)
+        self.remote_insert()
+        self.sync()
+        self.assertEqual(notes(self.ws.get_all_values()), ["theirs", "entry 0", "entry 1", "entry 3", "entry 4", "entry 5"])
+
+    def test_stale_base_is_skipped_and_reported(self):
+        base = app.row_version(self.entry(1))
+        edited = self.entry(1)[:app.ID_INDEX]
+        edited[10] = "mine"
+        self.mirror.enqueue("update", None, edited, self.ids[1], base=base)
+        self.ws.update([["changed elsewhere"]], "K3")
+        self.sync()
+        self.assertEqual(notes(self.ws.get_all_values())[1], "changed elsewhere")
+        [(row_id, theirs, mine)] = self.synchronizer.conflicts
+        self.assertEqual((row_id, theirs[10], mine[10]), (self.ids[1], "changed elsewhere", "mine"))
+
+    def test_crash_between_push_and_ack_does_not_duplicate(self):
+        row = text_rows(1, seed=9)[0] + [app.new_row_id()]
+        self.mirror.enqueue("append", None, row)
+        append_rows = self.ws.append_rows
+
+        def applied_then_lost(values, *args, **kwargs):
+            append_rows(values, *args, **kwargs)
+            raise APIError(FakeResponse(503, "connection reset after the write"))
+        self.ws.append_rows = applied_then_lost
+        self.synchronizer.sync_once()
+        self.assertIsInstance(self.synchronizer.last_error, APIError)
+        self.ws.append_rows = append_rows
+        # A restarted process starts a new synchronizer with the outbox still holding the append
+        self.sync(self.synchronizer_for(self.ws))
+        self.assertEqual([r[app.ID_INDEX] for r in self.ws.get_all_values()[1:]].count(row[app.ID_INDEX]), 1)
+
+    def test_mirror_uses_the_latest_handle(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(os.environ, {"TRACKER_MIRROR_DIR": directory}):
+            ws = make_worksheet(text_rows(3))
+            mirror = app.get_mirror(ws)
+            handle = app.GovernedWorksheet(ws, app.get_governor())  # e.g. after the pooled client was replaced
+            self.assertIs(app.get_mirror(handle), mirror)
+            _, synchronizer = app._mirror_registry()["mirrors"][app._sheet_key(ws)]
+            synchronizer.stopped.set()
+            self.assertIs(synchronizer.ws, handle)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+import numpy as np
+
+from helpers import app
+
+
+def row(**cells):
+    values = dict(zip(app.DEFAULT_COLUMNS, ["2024-05-01", "Camel", "1", "20", "380", "19", "Cash", "19", "0", "", ""]))
+    values.update(cells)
+    return [values[col] for col in app.DEFAULT_COLUMNS]
+
+
+class ParseGridTest(unittest.TestCase):
+    def test_typed_columns(self):
+        df, failures = app.parse_grid([app.DEFAULT_COLUMNS, row()])
+        self.assertEqual(failures, {})
+        self.assertEqual(df.loc[0, "Quantity"], 1.0)
+        self.assertEqual(str(df.loc[0, "Date"].date()), "2024-05-01")
+
+    def test_thousands_separators(self):
+        df, failures = app.parse_grid([app.DEFAULT_COLUMNS, row(Quantity="1,200", PricePerPack="1,360.50", TotalCost="81,630")])
+        self.assertEqual(failures, {})
+        self.assertEqual(df.loc[0, ["Quantity", "PricePerPack", "TotalCost"]].tolist(), [1200.0, 1360.5, 81630.0])
+
+    def test_bad_cells_are_counted(self):
+        df, failures = app.parse_grid([app.DEFAULT_COLUMNS, row(Quantity="lots"), row(Date="someday"), row(PricePerPack="")])
+        self.assertEqual(failures, {"Quantity": 1, "Date": 1})
+        self.assertTrue(np.isnan(df.loc[0, "Quantity"]))
+        self.assertTrue(np.isnan(df.loc[2, "PricePerPack"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
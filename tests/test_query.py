@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from helpers import app, text_rows
+
+
+class ParseQueryTest(unittest.TestCase):
+    def test_fields_operators_and_phrases(self):
+        terms = app.parse_query('vendor:raju qty>=2 Total<50 date:2021-03..2021-04 "late night" gold')
+        self.assertEqual([(t.field, t.op, t.value) for t in terms], [
+            ("Vendor", ":", "raju"),
+            ("Quantity", ">=", "2"),
+            ("TotalCost", "<", "50"),
+            ("Date", ":", "2021-03..2021-04"),
+            (None, ":", "late night"),
+            (None, ":", "gold"),
+        ])
+        self.assertTrue(app.is_structured(terms))
+
+    def test_unknown_fields_are_free_text(self):
+        terms = app.parse_query("time:12:30")
+        self.assertEqual([(t.field, t.value) for t in terms], [(None, "time:12:30")])
+        self.assertFalse(app.is_structured(terms))
+
+    def test_quoted_field_values(self):
+        terms = app.parse_query('vendor:"metro mart"')
+        self.assertEqual(terms[0].value, "metro mart")
+
+    def test_missing_value(self):
+        with self.assertRaises(app.QueryError):
+            app.parse_query("vendor:")
+
+
+class CompileQueryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.rows = text_rows(3000)
+        cls.df = app.parse_values([app.DEFAULT_COLUMNS] + cls.rows)
+
+    def mask(self, query):
+        return app.compile_query(app.parse_query(query), self.df).tolist()
+
+    def assertQuery(self, query, expected):
+        self.assertEqual(self.mask(query), expected.tolist(), query)
+
+    def contains(self, col, text):
+        return self.df[col].astype(str).str.lower().str.contains(text, regex=False).to_numpy()
+
+    def test_text_fields(self):
+        self.assertQuery("vendor:raju", self.contains("Vendor", "raju"))
+        self.assertQuery("payment:credit brand:gold", self.contains("PaymentMethod", "credit") & self.contains("Brand", "gold"))
+        self.assertQuery("vendor=RAJU", self.contains("Vendor", "raju"))
+
+    def test_numeric_comparisons(self):
+        df = self.df
+        self.assertQuery("outstanding>100", (df["Outstanding"] > 100).to_numpy())
+        self.assertQuery("outstanding>=100", (df["Outstanding"] >= 100).to_numpy())
+        self.assertQuery("price<300", (df["PricePerPack"] < 300).to_numpy())
+        self.assertQuery("price<=300", (df["PricePerPack"] <= 300).to_numpy())
+        self.assertQuery("units:10", (df["UnitsPerPack"] == 10).to_numpy())
+
+    def test_numeric_ranges(self):
+        qty = self.df["Quantity"]
+        self.assertQuery("qty:2..5", ((qty >= 2) & (qty <= 5)).to_numpy())
+        self.assertQuery("qty:..3", (qty <= 3).to_numpy())
+        self.assertQuery("qty:10..", (qty >= 10).to_numpy())
+
+    def test_dates(self):
+        dates = self.df["Date"]
+        self.assertQuery("date:2021", (dates.dt.year == 2021).to_numpy())
+        self.assertQuery("date:2021-03", ((dates.dt.year == 2021) & (dates.dt.month == 3)).to_numpy())
+        self.assertQuery("date:2021-03-05", (dates == pd.Timestamp("2021-03-05")).to_numpy())
+        self.assertQuery("date:2021-03..2021-04",
+                         ((dates >= pd.Timestamp("2021-03-01")) & (dates < pd.Timestamp("2021-05-01"))).to_numpy())
+        self.assertQuery("date>2023", (dates >= pd.Timestamp("2024-01-01")).to_numpy())
+        self.assertQuery("date<2020-06", (dates < pd.Timestamp("2020-06-01")).to_numpy())
+
+    def test_free_text_matches_any_column(self):
+        expected = np.zeros(len(self.df), dtype=bool)
+        for col in app.DEFAULT_COLUMNS:
+            expected |= self.contains(col, "late night")
+        self.assertQuery('"late night"', expected)
+
+    def test_free_text_with_index_matches_scan(self):
+        index = app.SearchIndex(self.rows)
+        terms = app.parse_query("raju friends")
+        self.assertEqual(app.compile_query(terms, self.df, index, self.rows).tolist(), self.mask("raju friends"))
+
+    def test_errors(self):
+        for query in ["date:03/2021", "qty>many", "vendor>raju"]:
+            with self.assertRaises(app.QueryError, msg=query):
+                self.mask(query)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from helpers import app, text_rows
+
+
+class RollupsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = app.parse_values([app.DEFAULT_COLUMNS] + text_rows(3000, seed=11))
+
+    def assertSameRollups(self, actual, expected):
+        for dim in app.ROLLUP_DIMENSIONS:
+            pd.testing.assert_frame_equal(actual.frame(dim), expected.frame(dim), check_exact=False, atol=1e-6)
+        np.testing.assert_allclose(actual.overall, expected.overall, atol=1e-6)
+
+    def test_analytics_match_groupby(self):
+        analytics = app.Rollups(self.df).analytics()
+        monthly = self.df.groupby(self.df["Date"].dt.to_period("M").dt.to_timestamp())["TotalCost"].sum()
+        np.testing.assert_allclose(analytics["spending"]["TotalCost"], monthly.to_numpy())
+        sticks = self.df.groupby(self.df["Brand"].astype(object))["Quantity"].sum().sort_index()
+        np.testing.assert_allclose(analytics["brand_freq"]["Quantity"], sticks.to_numpy())
+        self.assertAlmostEqual(analytics["total_outstanding"], self.df["Outstanding"].sum(), places=4)
+        counts = self.df["PaymentMethod"].astype(object).value_counts()
+        self.assertEqual(dict(zip(analytics["payment_counts"]["PaymentMethod"], analytics["payment_counts"]["Count"])),
+                         counts.to_dict())
+
+    def test_appends_match_rebuild(self):
+        rollups = app.Rollups(self.df.iloc[:1000])
+        for start in range(1000, len(self.df), 400):
+            rollups.add(self.df.iloc[start:start + 400])
+        self.assertSameRollups(rollups, app.Rollups(self.df))
+
+    def test_updates_and_deletes_match_rebuild(self):
+        rollups = app.Rollups(self.df)
+        edited = self.df.copy()
+        changed = edited.sample(200, random_state=2).index
+        edited.loc[changed, "Quantity"] = 7.0
+        edited.loc[changed, "TotalCost"] = 99.5
+        rollups.remove(self.df.loc[changed])
+        rollups.add(edited.loc[changed])
+        deleted = edited.sample(300, random_state=3).index
+        rollups.remove(edited.loc[deleted])
+        self.assertSameRollups(rollups, app.Rollups(edited.drop(index=deleted)))
+
+    def test_removing_a_whole_group_drops_it(self):
+        rollups = app.Rollups(self.df)
+        rollups.remove(self.df[self.df["Brand"] == "Camel"])
+        self.assertNotIn("Camel", rollups.frame("brand").index)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+from helpers import app, make_worksheet, text_rows
+
+
+def notes(ws):
+    return [row[10] for row in ws.get_all_values()[1:]]
+
+
+class RowIdTest(unittest.TestCase):
+    def setUp(self):
+        rows = text_rows(12, seed=2)
+        for i, row in enumerate(rows):
+            row[10] = f"entry {i}"
+        self.ws = make_worksheet(rows)
+        self.ids = [row[app.ID_INDEX] for row in self.ws.get_all_values()[1:]]
+        app.get_snapshot(self.ws)
+
+    def test_find_rows_after_they_move(self):
+        self.ws.insert_row(["2020-01-01", "Other"], index=2)  # someone else inserts above
+        self.ws.delete_rows(6)                                   # and deletes entry 3
+        found = app.find_row_ids(self.ws, self.ids)
+        self.assertNotIn(self.ids[3], found)
+        self.assertEqual(found[self.ids[0]], 3)
+        self.assertEqual(found[self.ids[5]], 7)
+
+    def test_read_rows_follows_moved_rows(self):
+        self.ws.insert_row(["2020-01-01", "Other"], index=2)
+        rows = app.read_rows(self.ws, [self.ids[4], self.ids[9]])
+        self.assertEqual(rows[self.ids[4]][0], 7)
+        self.assertEqual(rows[self.ids[4]][1][10], "entry 4")
+        self.assertEqual(rows[self.ids[9]][1][10], "entry 9")
+
+    def test_update_by_id_hits_the_moved_row(self):
+        self.ws.delete_rows(2)  # entry 0 removed elsewhere; everything shifts up
+        row = self.ws.get_all_values()[5][:app.ID_INDEX]  # entry 5
+        row[10] = "edited"
+        app.batch_update_entries(self.ws, {self.ids[5]: row})
+        self.assertEqual(notes(self.ws), [f"entry {i}" for i in range(1, 5)] + ["edited"] + [f"entry {i}" for i in range(6, 12)])
+        self.assertEqual(self.ws.get_all_values()[5][app.ID_INDEX], self.ids[5])
+
+    def test_deleted_entry_is_reported(self):
+        self.ws.delete_rows(4)
+        with self.assertRaises(app.RowNotFoundError):
+            app.resolve_rows(self.ws, [self.ids[2]])
+
+    def test_conflicting_edit_is_refused(self):
+        base = app.row_version(self.ws.get_all_values()[3])
+        self.ws.update([["changed elsewhere"]], "K4")
+        row = self.ws.get_all_values()[3][:app.ID_INDEX]
+        with self.assertRaises(app.ConflictError) as raised:
+            app.batch_update_entries(self.ws, {self.ids[2]: row[:10] + ["mine"]}, {self.ids[2]: base})
+        self.assertEqual(raised.exception.current[self.ids[2]][10], "changed elsewhere")
+        self.assertEqual(notes(self.ws)[2], "changed elsewhere")
+
+
+class AssignMissingIdsTest(unittest.TestCase):
+    def setUp(self):
+        rows = text_rows(8, seed=4)
+        for i, row in enumerate(rows):
+            row[10] = f"entry {i}"
+        self.ws = make_worksheet(rows, ids=False)
+
+    def test_backfills_header_and_ids(self):
+        app.assign_missing_ids(self.ws)
+        values = self.ws.get_all_values()
+        self.assertEqual(values[0], app.SHEET_COLUMNS)
+        ids = [row[app.ID_INDEX] for row in values[1:]]
+        self.assertTrue(all(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_keeps_existing_ids_and_blank_rows(self):
+        app.assign_missing_ids(self.ws)
+        before = [row[app.ID_INDEX] for row in self.ws.get_all_values()[1:]]
+        self.ws.append_row(["2025-01-01", "Typed", "1", "20", "100", "5", "Cash", "5", "0", "", "typed in"])
+        self.ws.update([[""] * 11], "A4")  # a row cleared by hand, ID left behind
+        self.ws.update([[""]], "L4")
+        app.assign_missing_ids(self.ws)
+        values = self.ws.get_all_values()
+        after = [row[app.ID_INDEX] for row in values[1:]]
+        self.assertEqual(after[:2] + after[3:8], before[:2] + before[3:8])
+        self.assertEqual(after[2], "")
+        self.assertTrue(after[8])
+
+    def test_concurrent_delete_does_not_move_ids(self):
+        batch_get = self.ws.batch_get
+
+        def delete_then_read(ranges, *args, **kwargs):
+            self.ws.delete_rows(3)  # another user deletes entry 1 between our read and write
+            return batch_get(ranges, *args, **kwargs)
+
+        self.ws.batch_get = delete_then_read
+        app.assign_missing_ids(self.ws)
+        self.ws.batch_get = batch_get
+        values = self.ws.get_all_values()[1:]
+        # Rows that moved are left for the next pass rather than given someone else's ID
+        self.assertEqual([row[10] for row in values if row[app.ID_INDEX]], ["entry 0"])
+        app.assign_missing_ids(self.ws)
+        values = self.ws.get_all_values()[1:]
+        self.assertEqual(len(values), 7)
+        self.assertTrue(all(row[app.ID_INDEX] for row in values))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+from helpers import app, make_worksheet, scan, text_rows
+
+KEYWORDS = ["raju", "Gold", "flake", "late night", "marl", "2021-03", "360", "&", "with friends", "zzz"]
+
+
+class SearchIndexTest(unittest.TestCase):
+    def assertMatchesScan(self, index, rows):
+        for keyword in KEYWORDS:
+            found = index.search(keyword, rows)
+            if found is None:  # nothing to index on; the caller scans
+                continue
+            self.assertEqual(found.tolist(), scan(rows, keyword), keyword)
+
+    def test_bulk_build(self):
+        rows = text_rows(3000)
+        self.assertMatchesScan(app.SearchIndex(rows), rows)
+
+    def test_append_update_delete(self):
+        rows = text_rows(1500)
+        index = app.SearchIndex(rows)
+        rng = random.Random(1)
+
+        extra = text_rows(200, seed=8)
+        index.append(extra)
+        rows += extra
+        for _ in range(100):
+            pos = rng.randrange(len(rows))
+            row = list(rows[rng.randrange(len(rows))])
+            row[10] = rng.choice(["late night", "raju's tab", "", "gold rush"])
+            index.update(pos, row)
+            rows[pos] = row
+        for _ in range(100):
+            pos = rng.randrange(len(rows))
+            index.delete(pos)
+            del rows[pos]
+        self.assertMatchesScan(index, rows)
+
+    def test_id_column_is_not_searchable(self):
+        rows = [row + ["abc123"] for row in text_rows(50)]
+        index = app.SearchIndex(rows, width=app.ID_INDEX)
+        self.assertEqual(index.search("abc123", rows).tolist(), [])
+
+
+class SearchDataTest(unittest.TestCase):
+    def setUp(self):
+        self.ws = make_worksheet(text_rows(2000))
+        self.rows = self.ws.get_all_values()[1:]
+
+    def found(self, keyword):
+        return app.search_data(self.ws, keyword).tolist()
+
+    def test_plain_and_quoted_phrases(self):
+        self.assertEqual(self.found("raju"), scan(self.rows, "raju"))
+        self.assertEqual(self.found('"late night"'), scan(self.rows, "late night"))
+
+    def test_terms_are_combined_with_and(self):
+        expected = sorted(set(scan(self.rows, "raju")) & set(scan(self.rows, "late night")))
+        self.assertEqual(self.found('raju "late night"'), expected)
+
+    def test_follows_appended_rows(self):
+        app.get_search_index(self.ws, app.get_snapshot(self.ws))
+        row = ["2025-02-01", "Camel", 1, 20, 380.0, 19.0, "Cash", 19.0, 0.0, "Brand New Kiosk", "", app.new_row_id()]
+        app.append_entries(self.ws, [row])
+        self.assertEqual(self.found("new kiosk"), [len(self.rows)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from helpers import app, make_worksheet, scan, text_rows
+
+
+class SnapshotOracleTest(unittest.TestCase):
+    """After every change the cached snapshot must equal a fresh parse of the sheet."""
+
+    def setUp(self):
+        self.ws = make_worksheet(text_rows(40, seed=5))
+        self.fresh = iter(text_rows(500, seed=9))
+        self.rng = random.Random(11)
+        snap = app.get_snapshot(self.ws)
+        app.get_search_index(self.ws, snap)
+        app.get_rollups(self.ws, snap)
+        app.get_ledger(self.ws, snap)
+
+    def new_row(self):
+        return next(self.fresh) + [app.new_row_id()]
+
+    def random_id(self):
+        return self.rng.choice(sorted(app.get_snapshot(self.ws).row_ids))
+
+    def random_row_num(self):
+        return self.rng.randint(2, len(self.ws.get_all_values()))
+
+    def assertMatchesSheet(self):
+        snap = app.get_snapshot(self.ws)
+        values = self.ws.get_all_values()
+        expected = app.parse_values(values)
+        pd.testing.assert_frame_equal(snap.df.astype(object), expected.astype(object))
+        self.assertEqual(snap.row_ids, app._row_id_map(values)[0])
+        if snap.search_index is not None:
+            rows = values[1:]
+            self.assertEqual(snap.search_index.search("raju", rows).tolist(), scan(rows, "raju"))
+        if snap.rollups is not None:
+            np.testing.assert_allclose(snap.rollups.overall, app.Rollups(expected).overall, atol=1e-6)
+
+    # ----- local writes -----
+    def local_append(self):
+        app.append_entries(self.ws, [self.new_row()])
+
+    def local_edit(self):
+        app.batch_update_entries(self.ws, {self.random_id(): next(self.fresh)})
+
+    def local_delete(self):
+        app.delete_data(self.ws, None, row_id=self.random_id())
+
+    # ----- changes made elsewhere -----
+    def external_append(self):
+        self.ws.append_row(self.new_row())
+
+    def external_edit(self):
+        row_num = self.random_row_num()
+        self.ws.update([next(self.fresh)], f"A{row_num}")
+
+    def external_delete(self):
+        self.ws.delete_rows(self.random_row_num())
+
+    @mock.patch.object(app, "PREFIX_SAMPLE_ROWS", 10**6)
+    def test_random_local_and_external_changes(self):
+        # Sampling every row makes the append check exact (edits outside a sample wait for snapshot expiry)
+        actions = [self.local_append, self.local_edit, self.local_delete,
+                   self.external_append, self.external_edit, self.external_delete]
+        for step in range(60):
+            for action in self.rng.sample(actions, self.rng.randint(1, 2)):
+                action()
+            app.probe_for_changes(self.ws)
+            with self.subTest(step=step):
+                self.assertMatchesSheet()
+
+    def test_local_writes_keep_the_snapshot(self):
+        for action in [self.local_append, self.local_edit, self.local_delete] * 5:
+            action()
+            snap = app._snapshot_store()["snapshots"].get(app._sheet_key(self.ws))
+            self.assertIsNotNone(snap)
+            self.assertMatchesSheet()
+
+    def test_external_append_is_merged(self):
+        before = app.get_snapshot(self.ws)
+        self.external_append()
+        self.assertTrue(app.probe_for_changes(self.ws))
+        snap = app._snapshot_store()["snapshots"].get(app._sheet_key(self.ws))
+        self.assertIsNotNone(snap)
+        self.assertEqual(len(snap.values), len(before.values) + 1)
+        self.assertMatchesSheet()
+
+    def test_mid_sheet_edit_drops_the_snapshot(self):
+        self.ws.update([next(self.fresh)], "A7")
+        self.assertTrue(app.probe_for_changes(self.ws))
+        self.assertNotIn(app._sheet_key(self.ws), app._snapshot_store()["snapshots"])
+        self.assertMatchesSheet()
+
+    def test_write_after_an_unseen_edit_drops_the_snapshot(self):
+        self.ws.update([next(self.fresh)], "A7")
+        self.local_append()
+        self.assertNotIn(app._sheet_key(self.ws), app._snapshot_store()["snapshots"])
+        self.assertMatchesSheet()
+
+
+class ChangeProbeTest(unittest.TestCase):
+    def test_watch_keeps_the_latest_handle(self):
+        probe = app.ChangeProbe()
+        old = make_worksheet([])
+        new = app.GovernedWorksheet(old, app.get_governor())  # e.g. after the pooled client was replaced
+        probe.watch(old)
+        probe.watch(new)
+        self.assertEqual(list(probe.sheets.values()), [new])
+
+
+if __name__ == "__main__":
+    unittest.main()
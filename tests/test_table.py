@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from helpers import app, make_worksheet, text_rows
+
+
+class TablePositionsTest(unittest.TestCase):
+    def setUp(self):
+        self.ws = make_worksheet(text_rows(1500, seed=21))
+        self.snap = app.get_snapshot(self.ws)
+        self.df = self.snap.df
+
+    def positions(self, query="", sort_by="Date", descending=True):
+        return app.table_positions(self.ws, app.get_snapshot(self.ws), query, sort_by, descending).tolist()
+
+    def expected_order(self, sort_by, descending, df=None):
+        df = self.df if df is None else df
+        series = df[sort_by].astype(object) if sort_by in app.CATEGORICAL_COLUMNS else df[sort_by]
+        return series.sort_values(ascending=not descending, na_position="last", kind="stable").index.tolist()
+
+    def test_sorts_every_column_both_ways(self):
+        for sort_by in app.DEFAULT_COLUMNS:
+            for descending in (False, True):
+                with self.subTest(sort_by=sort_by, descending=descending):
+                    self.assertEqual(self.positions(sort_by=sort_by, descending=descending),
+                                     self.expected_order(sort_by, descending))
+
+    def test_categories_sort_by_name(self):
+        brands = self.df["Brand"].iloc[self.positions(sort_by="Brand", descending=False)].astype(object).tolist()
+        self.assertEqual(brands, sorted(brands))
+
+    def test_filter_keeps_the_sort_order(self):
+        query = "outstanding>0 payment:credit"
+        mask = app.compile_query(app.parse_query(query), self.df)
+        self.assertTrue(0 < mask.sum() < len(self.df))
+        positions = self.positions(query, sort_by="TotalCost", descending=True)
+        self.assertEqual(sorted(positions), np.flatnonzero(mask).tolist())
+        self.assertEqual(positions, [p for p in self.expected_order("TotalCost", True) if mask[p]])
+
+    def test_filter_without_matches(self):
+        self.assertEqual(self.positions("vendor:nobody-sells-here"), [])
+
+    def test_invalid_filter_raises(self):
+        with self.assertRaises(app.QueryError):
+            self.positions("total>abc")
+
+    def test_follows_writes(self):
+        self.positions(sort_by="Date", descending=True)
+        row = ["2030-01-01", "Camel", 1, 20, 380.0, 19.0, "Cash", 19.0, 0.0, "Future Kiosk", "", app.new_row_id()]
+        app.append_entries(self.ws, [row])
+        self.assertEqual(self.positions(sort_by="Date", descending=True)[0], len(self.df))
+        self.assertEqual(self.positions("vendor:future"), [len(self.df)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from gspread.exceptions import APIError
+
+from fake_sheets import FakeResponse, FakeWorksheet
+from helpers import app, make_worksheet, text_rows
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def entries(n, seed=3):
+    return [row + [app.new_row_id()] for row in text_rows(n, seed=seed)]
+
+
+class WriteBehindQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.flushes = []
+
+    def make_queue(self, ws, batch_size=4):
+        path = os.path.join(self.dir.name, f"{ws.spreadsheet_id}.sqlite")
+        # The background thread stays idle: a long interval and no wake-ups from put()
+        queue = app.WriteBehindQueue(ws, path, lambda *args: self.flushes.append(args), batch_size=batch_size, interval=3600)
+        queue.wake.set = lambda: None
+        return queue
+
+    def governed(self, ws, clock=None):
+        clock = clock or FakeClock()
+        return app.GovernedWorksheet(ws, app.SheetsGovernor(clock=clock, sleep=clock.sleep, rng=lambda: 0.0))
+
+    def flush_until_empty(self, queue, attempts=50):
+        for _ in range(attempts):
+            try:
+                queue.flush()
+            except APIError:
+                continue
+            if not queue.pending_count():
+                return
+        self.fail(f"{queue.pending_count()} entries still queued")
+
+    def assertEachRowOnce(self, ws, rows):
+        ids = [row[app.ID_INDEX] for row in ws.get_all_values()[1:]]
+        self.assertEqual(sorted(ids), sorted(row[app.ID_INDEX] for row in rows))
+
+    def test_flush_sends_batches_in_order(self):
+        ws = make_worksheet([])
+        queue = self.make_queue(ws)
+        rows = entries(10)
+        for row in rows:
+            queue.put(row)
+        self.assertEqual(queue.flush(), 10)
+        self.assertEqual(ws.call_counts["append_rows"], 3)
+        self.assertEqual(ws.get_all_values()[1:], [[app._cell_text(c) for c in row] for row in rows])
+        self.assertEqual([last_row for last_row, _ in self.flushes], [5, 9, 11])
+        self.assertEqual(queue.pending_count(), 0)
+
+    def test_applied_append_that_failed_is_not_repeated(self):
+        ws = make_worksheet([])
+        append_rows, calls = ws.append_rows, []
+
+        def applied_then_failed(values, *args, **kwargs):
+            response = append_rows(values, *args, **kwargs)
+            calls.append(1)
+            if len(calls) == 2:
+                raise APIError(FakeResponse(503, "fake failure"))
+            return response
+        ws.append_rows = applied_then_failed
+        queue = self.make_queue(self.governed(ws))
+        rows = entries(10)
+        for row in rows:
+            queue.put(row)
+        self.flush_until_empty(queue)
+        self.assertFalse(queue.unconfirmed)
+        self.assertEachRowOnce(ws, rows)
+
+    def test_restart_after_an_applied_append_does_not_repeat_it(self):
+        ws = make_worksheet([])
+        queue = self.make_queue(ws)
+        rows = entries(3)
+        for row in rows:
+            queue.put(row)
+        ws.append_rows(queue.pending_rows())  # sent, then the process stopped before deleting them
+        self.assertEqual(self.make_queue(ws).flush(), 0)
+        self.assertEachRowOnce(ws, rows)
+
+    def test_server_errors_deliver_each_row_once(self):
+        random.seed(5)
+        ws = make_worksheet([])
+        ws.error_rate = 0.3
+        queue = self.make_queue(self.governed(ws))
+        rows = entries(25)
+        for row in rows:
+            queue.put(row)
+        self.flush_until_empty(queue)
+        ws.error_rate = 0.0
+        self.assertEachRowOnce(ws, rows)
+
+    def test_quota_errors_deliver_each_row_once(self):
+        clock = FakeClock()
+        ws = FakeWorksheet([app.SHEET_COLUMNS], spreadsheet_id="test-write-queue-quota", quota_per_minute=3, clock=clock)
+        queue = self.make_queue(self.governed(ws, clock))
+        rows = entries(25)
+        for row in rows:
+            queue.put(row)
+        self.flush_until_empty(queue)
+        self.assertEachRowOnce(ws, rows)
+
+
+class QueuedSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(app, "WRITE_QUEUE_DIR", directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ws = make_worksheet(text_rows(20))
+        self.queue = app.get_write_queue(self.ws)
+        self.queue.wake.set = lambda: None
+
+    def snapshot(self):
+        return app._snapshot_store()["snapshots"].get(app._sheet_key(self.ws))
+
+    def test_flush_keeps_the_patched_snapshot(self):
+        app.get_snapshot(self.ws)
+        rows = entries(3)
+        for row in rows:
+            self.queue.put(row)
+            app.sync_after_write(self.ws, lambda snap, row=row: app.snapshot_with_appended(snap, [row]), verify=False)
+        self.assertEqual(len(app.get_snapshot(self.ws).values), 24)
+        app.flush_pending_entries(self.ws)
+        snap = self.snapshot()
+        self.assertIsNotNone(snap)
+        self.assertEqual(snap.values, self.ws.get_all_values())
+
+    def test_flush_after_another_append_drops_the_snapshot(self):
+        app.get_snapshot(self.ws)
+        row = entries(1)[0]
+        self.queue.put(row)
+        app.sync_after_write(self.ws, lambda snap: app.snapshot_with_appended(snap, [row]), verify=False)
+        self.ws.append_row(entries(1, seed=4)[0])  # lands before our queued entry
+        app.flush_pending_entries(self.ws)
+        self.assertIsNone(self.snapshot())
+
+    def test_queue_uses_the_latest_handle(self):
+        handle = app.GovernedWorksheet(self.ws, app.get_governor())  # e.g. after the pooled client was replaced
+        self.assertIs(app.get_write_queue(handle), self.queue)
+        self.assertIs(self.queue.ws, handle)
+
+
+if __name__ == "__main__":
+    unittest.main()